@@ -0,0 +1,81 @@
+"""Parsing benchmarks over synthetic files.
+
+For each sample of synthetic.samples (or the files given on the command
+line), reports the best parse time of AsepriteFile over a few runs, the peak
+memory allocated while parsing and how the parse time splits between chunk
+types, as recorded by AsepriteFile.stats. Numbers are only comparable
+between runs on the same machine.
+
+    python benchmarks/run.py [--repeat N] [--lazy] [--sample NAME]... [FILE]...
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import aseprite
+
+import synthetic
+
+
+def parse(data, lazy):
+    return aseprite.AsepriteFile(data, lazy=lazy)
+
+
+def parse_time(data, lazy, repeat):
+    """Returns the best parse time in seconds over repeat runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(data, lazy)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def peak_memory(data, lazy):
+    """Returns the peak size in bytes of the memory allocated while parsing."""
+    tracemalloc.start()
+    try:
+        parse(data, lazy)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(name, data, lazy, repeat):
+    seconds = parse_time(data, lazy, repeat)
+    peak = peak_memory(data, lazy)
+    print('{}: {} KiB, parsed in {:.2f} ms, peak memory {} KiB'.format(
+        name, len(data) // 1024, seconds * 1000, peak // 1024))
+    stats = parse(data, lazy).stats
+    for chunk_type, chunk_stats in sorted(stats.chunk_types.items(), key=lambda item: -item[1].time):
+        print('    0x{:04x}: {:6} chunks, {:8.3f} ms, {:7.2f} us/chunk, {} KiB decompressed'.format(
+            chunk_type, chunk_stats.count, chunk_stats.time * 1000, chunk_stats.time * 1e6 / chunk_stats.count,
+            chunk_stats.decompressed_bytes // 1024))
+
+
+def main(argv=None):
+    argument_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argument_parser.add_argument('files', nargs='*', help='Files to benchmark instead of the samples')
+    argument_parser.add_argument('--repeat', type=int, default=5, help='Number of timed parses')
+    argument_parser.add_argument('--lazy', action='store_true', help='Parse with lazy=True')
+    argument_parser.add_argument('--sample', action='append', choices=sorted(synthetic.samples),
+                                 help='Only run that sample, can be repeated')
+    arguments = argument_parser.parse_args(argv)
+
+    if arguments.files:
+        for path in arguments.files:
+            with open(path, 'rb') as f:
+                report(path, f.read(), arguments.lazy, arguments.repeat)
+        return
+    for name in arguments.sample or synthetic.samples:
+        report(name, synthetic.generate(**synthetic.samples[name]), arguments.lazy, arguments.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Deterministic generator of synthetic Aseprite files.
+
+The files aren't meant to look like anything, only to exercise the parser:
+every color depth, layer groups, tilemaps and their tileset, linked cels,
+slices, tags and palettes of any size. The same arguments always give the
+same bytes.
+
+Run as a script to write a set of sample files to a folder.
+"""
+import os
+import random
+import sys
+import struct
+import zlib
+
+
+def _string(value):
+    encoded = value.encode('utf-8')
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def _chunk(chunk_type, payload):
+    return struct.pack('<IH', len(payload) + 6, chunk_type) + payload
+
+
+def _layer_chunk(name, layer_type, child_level, blend_mode=0, opacity=255, flags=3, tileset_index=0):
+    payload = struct.pack('<HHHHHHB3x', flags, layer_type, child_level, 0, 0, blend_mode, opacity)
+    payload += _string(name)
+    if layer_type == 2:
+        payload += struct.pack('<I', tileset_index)
+    return _chunk(0x2004, payload)
+
+
+def _cel_header(layer_index, x, y, opacity, cel_type):
+    return struct.pack('<HhhBHh5x', layer_index, x, y, opacity, cel_type, 0)
+
+
+def _pixels(rng, width, height, bpp, palette_size):
+    size = width * height * bpp
+    pixels = rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+    if bpp == 1 and palette_size < 256:
+        pixels = bytes(index % palette_size for index in pixels)
+    return pixels
+
+
+def generate(width=64, height=64, num_frames=4, num_layers=3, color_depth=32,
+             groups=True, tilemap=True, linked=True, raw_cels=False, num_slices=2, num_tags=2,
+             palette_size=256, tile_size=8, num_tiles=4, seed=0):
+    """Returns the bytes of a synthetic file.
+
+    Every third layer opens a group of the two next ones if groups is set, a
+    tilemap layer is added on top if tilemap is set. With linked set, odd
+    frames link their cels to the previous frame's. raw_cels stores the
+    image cels uncompressed.
+    """
+    rng = random.Random(seed)
+    bpp = color_depth // 8
+    layers = []
+    for index in range(num_layers):
+        if groups and index % 3 == 0 and index + 2 < num_layers:
+            layers.append(('Group {}'.format(index), 1, 0))
+        else:
+            level = 1 if groups and layers and (layers[-1][1] == 1 or layers[-1][2] == 1) and index % 3 != 0 else 0
+            layers.append(('Layer {}'.format(index), 0, level))
+    if tilemap:
+        layers.append(('Tilemap', 2, 0))
+
+    frames = []
+    for frame_index in range(num_frames):
+        chunks = []
+        if frame_index == 0:
+            profile = struct.pack('<HHI8x', 1, 0, 0)
+            chunks.append(_chunk(0x2007, profile))
+            palette = struct.pack('<III8x', palette_size, 0, palette_size - 1)
+            for color in range(palette_size):
+                flags = 1 if color % 64 == 0 else 0
+                palette += struct.pack('<HBBBB', flags, rng.randrange(256), rng.randrange(256), rng.randrange(256), 255)
+                if flags:
+                    palette += _string('Color {}'.format(color))
+            chunks.append(_chunk(0x2019, palette))
+            if tilemap:
+                tileset = struct.pack('<IIIHHh14x', 0, 2, num_tiles, tile_size, tile_size, 1)
+                tileset += _string('Tileset')
+                image = zlib.compress(_pixels(rng, tile_size, tile_size * num_tiles, bpp, palette_size))
+                tileset += struct.pack('<I', len(image)) + image
+                chunks.append(_chunk(0x2023, tileset))
+            for name, layer_type, level in layers:
+                chunks.append(_layer_chunk(name, layer_type, level))
+            if num_tags:
+                tags = struct.pack('<H8x', num_tags)
+                for tag in range(num_tags):
+                    start = tag * num_frames // num_tags
+                    end = max(start, (tag + 1) * num_frames // num_tags - 1)
+                    tags += struct.pack('<HHBH6x3Bx', start, end, tag % 4, 0, 255, 0, 0)
+                    tags += _string('Tag {}'.format(tag))
+                chunks.append(_chunk(0x2018, tags))
+            for index in range(num_slices):
+                flags = index % 4
+                payload = struct.pack('<III', 1, flags, 0) + _string('Slice {}'.format(index))
+                payload += struct.pack('<IiiII', 0, index, index, 8, 8)
+                if flags & 1:
+                    payload += struct.pack('<iiII', 1, 1, 6, 6)
+                if flags & 2:
+                    payload += struct.pack('<ii', 4, 4)
+                chunks.append(_chunk(0x2022, payload))
+        for layer_index, (name, layer_type, level) in enumerate(layers):
+            if layer_type == 1:
+                continue
+            if linked and frame_index % 2 == 1:
+                chunks.append(_chunk(0x2005, _cel_header(layer_index, 0, 0, 255, 1)
+                                     + struct.pack('<H', frame_index - 1)))
+                continue
+            if layer_type == 2:
+                tiles_w = max(1, width // tile_size)
+                tiles_h = max(1, height // tile_size)
+                tiles = b''.join(struct.pack('<I', rng.randrange(num_tiles) | (rng.randrange(8) << 29))
+                                 for _ in range(tiles_w * tiles_h))
+                payload = _cel_header(layer_index, 0, 0, 255, 3)
+                payload += struct.pack('<HHHIIII10x', tiles_w, tiles_h, 32,
+                                       0x1fffffff, 0x80000000, 0x40000000, 0x20000000)
+                payload += zlib.compress(tiles)
+                chunks.append(_chunk(0x2005, payload))
+                continue
+            cel_w = rng.randrange(1, width + 1)
+            cel_h = rng.randrange(1, height + 1)
+            x = rng.randrange(0, width - cel_w + 1)
+            y = rng.randrange(0, height - cel_h + 1)
+            pixels = _pixels(rng, cel_w, cel_h, bpp, palette_size)
+            if raw_cels:
+                payload = _cel_header(layer_index, x, y, 255, 0) + struct.pack('<HH', cel_w, cel_h) + pixels
+            else:
+                payload = _cel_header(layer_index, x, y, rng.choice((255, 128)), 2)
+                payload += struct.pack('<HH', cel_w, cel_h) + zlib.compress(pixels)
+            chunks.append(_chunk(0x2005, payload))
+        body = b''.join(chunks)
+        frames.append(struct.pack('<IHHHxxI', len(body) + 16, 0xF1FA, len(chunks), 100, len(chunks)) + body)
+
+    body = b''.join(frames)
+    header = struct.pack('<IHHHHHIH8xB3xHBBhhHH84x',
+                         len(body) + 128, 0xA5E0, num_frames, width, height, color_depth,
+                         1, 100, 0, palette_size if palette_size < 256 else 0, 1, 1, 0, 0, 16, 16)
+    return header + body
+
+
+# Name -> generate() arguments of the sample files
+samples = {
+    'rgba': {'color_depth': 32},
+    'grayscale': {'color_depth': 16},
+    'indexed': {'color_depth': 8},
+    'raw': {'raw_cels': True},
+    'large_palette': {'color_depth': 8, 'palette_size': 4096},
+    'many_frames': {'width': 32, 'height': 32, 'num_frames': 200, 'num_layers': 6},
+    'many_layers': {'width': 32, 'height': 32, 'num_frames': 8, 'num_layers': 120},
+    'large_canvas': {'width': 1024, 'height': 1024, 'num_frames': 2, 'num_layers': 2},
+}
+
+
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else '.'
+    os.makedirs(folder, exist_ok=True)
+    for name, arguments in samples.items():
+        with open(os.path.join(folder, name + '.aseprite'), 'wb') as f:
+            f.write(generate(**arguments))
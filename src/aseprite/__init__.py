@@ -1,4 +1,7 @@
+import mmap
+
 from .headers import Header, Frame
+from .index import FileIndex, FrameEntry, ChunkEntry
 from .chunks import (
     Chunk,
     OldPaleteChunk_0x0004,
@@ -6,8 +9,10 @@ from .chunks import (
     LayerChunk,
     LayerGroupChunk,
     CelChunk,
+    CelCache,
     CelExtraChunk,
     ColorProfileChunk,
+    ExternalFilesChunk,
     MaskChunk,
     FrameTagsChunk,
     PathChunk,
@@ -16,12 +21,172 @@ from .chunks import (
     SliceChunk,
     TilesetChunk
 )
+from .parser import (
+    ParseContext,
+    ParseStats,
+    ChunkTypeStats,
+    SkippedChunk,
+    register_chunk_type,
+    chunk_class_handler,
+    parse_frame
+)
+from .render import render_frame, IncrementalRenderer
+from .stream import StreamReader, iter_frames
+from .probe import probe, ProbeResult
+from .writer import WriteContext, register_chunk_writer, write_file
 
 class AsepriteFile(object):
-    def __init__(self, data):
-        self.header, self.frames = AsepriteFile.parse_data(data)
+    def __init__(self, data, lazy=False, cel_cache_size=None, load_frames=True, index=None, decode_workers=None):
+        """Parses the whole file.
+
+        With lazy set, cels only store where their pixel data is and decompress
+        it on first access. cel_cache_size bounds how many lazy cels keep their
+        decompressed data in memory at once (unbounded if None).
+
+        If load_frames is False, only the header and the first frame (holding
+        the layers) are parsed, the other frames are parsed on demand by
+        frame(). The frame offsets come from index, or from a scan of the frame
+        and chunk headers if index is None or doesn't match the file.
+
+        decode_workers decompresses the cels and tilesets of a non-lazy load
+        on that many threads once the chunks have been walked.
+
+        stats is a ParseStats holding the parse times and sizes per chunk type
+        and the skipped chunks, frames parsed on demand adding to it.
+        """
+        self.mapping = None
+        self.lazy = lazy
+        self.decode_workers = decode_workers
+        self.cel_cache = CelCache(cel_cache_size) if cel_cache_size is not None else None
+        # (layer index, frame index) -> cel
+        self.cels = {}
+        self.stats = ParseStats()
+        if load_frames:
+            self.data = None
+            self.index = None
+            self.header, self.frames = AsepriteFile.parse_data(data, lazy, self.cel_cache, decode_workers, self.stats)
+            for frame_index, frame in enumerate(self.frames):
+                self.link_cels(frame_index, frame)
+        else:
+            # Kept to parse the frames later on.
+            self.data = memoryview(data).cast('B')
+            self.header = Header(self.data)
+            if index is None or not index.matches(self.header):
+                index = FileIndex.scan(self.data, self.header)
+            self.index = index
+            self.frames = [None] * self.header.num_frames
+            self.frame(0)
         self.build_layer_tree()
 
+    @classmethod
+    def open(cls, path, lazy=False, cel_cache_size=None, load_frames=True, index=None, decode_workers=None):
+        """Memory-maps the file at path and parses it without copying it.
+
+        Chunk payloads (compressed cels, raw cels, ICC profiles...) are views on
+        the mapping, which stays open until close() is called. Closing copies
+        the payloads that are still referenced so the parsed file stays usable.
+        """
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            parsed_file = cls(mapping, lazy, cel_cache_size, load_frames, index, decode_workers)
+        except:
+            try:
+                mapping.close()
+            except BufferError:
+                # Still referenced by the error's traceback, it'll be closed once collected.
+                pass
+            raise
+        parsed_file.mapping = mapping
+        return parsed_file
+
+    def frame(self, frame_index):
+        """Returns a frame, parsing it first if the file was loaded without its frames.
+
+        The frames the linked cels of this frame point to are parsed as well.
+        """
+        frame = self.frames[frame_index]
+        if frame is not None:
+            return frame
+        if self.data is None:
+            raise ValueError('Cannot parse frame {}, the file is closed'.format(frame_index))
+
+        layer_index = 0
+        for previous_frame in self.index.frames[:frame_index]:
+            layer_index += sum(1 for chunk in previous_frame.chunks if chunk.chunk_type == LayerChunk.chunk_id)
+        context = ParseContext(self.lazy, self.cel_cache, layer_index, self.header.color_depth, self.decode_workers, self.stats)
+        frame = parse_frame(self.data, self.index.frames[frame_index].offset, context)
+        context.decompress_pending()
+        self.frames[frame_index] = frame
+
+        for chunk in frame.chunks:
+            if isinstance(chunk, CelChunk) and chunk.cel_type == 1:
+                self.frame(chunk.data['link'])
+        self.link_cels(frame_index, frame)
+        return frame
+
+    def link_cels(self, frame_index, frame):
+        """Indexes a parsed frame's cels and resolves its linked cels.
+
+        The frames the linked cels point to must have been indexed before.
+        """
+        for chunk in frame.chunks:
+            if isinstance(chunk, CelChunk):
+                self.cels[(chunk.layer_index, frame_index)] = chunk
+                if chunk.cel_type == 1:
+                    source = self.cels.get((chunk.layer_index, chunk.data['link']))
+                    if source is not None:
+                        chunk.resolve_link(source)
+
+    def get_cel(self, layer_index, frame_index):
+        """Returns the cel of a layer at a frame, or None if that layer has no cel there."""
+        self.frame(frame_index)
+        return self.cels.get((layer_index, frame_index))
+
+    def close(self):
+        """Releases the memory mapping when the file was opened with open()."""
+        if self.mapping is None:
+            return
+        if self.cel_cache is not None:
+            self.cel_cache.clear()
+        for frame in self.frames:
+            if frame is None:
+                continue
+            for chunk in frame.chunks:
+                chunk.detach()
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        self.mapping.close()
+        self.mapping = None
+
+    def __getstate__(self):
+        # The frames can't be parsed on demand without the file's buffer.
+        if self.data is not None:
+            for frame_index in range(len(self.frames)):
+                self.frame(frame_index)
+        state = dict(self.__dict__)
+        state['mapping'] = None
+        state['data'] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def render_frame(self, frame_index, region=None):
+        """Flattens the visible layers of a frame into a (height, width, 4) RGBA NumPy array.
+
+        See render.render_frame.
+        """
+        return render_frame(self, frame_index, region)
+
+    def save(self, path, compress_level=6):
+        """Writes the file back to path, see writer.file_bytes."""
+        write_file(self, path, compress_level)
+
     def build_layer_tree(self):
         # Assuming that layers are stored in chunk #0.
         # Warn me if they're stored in another chunk
@@ -42,54 +207,18 @@ class AsepriteFile(object):
 
 
     @staticmethod
-    def parse_data(data):
+    def parse_data(data, lazy=False, cel_cache=None, decode_workers=None, stats=None):
+        # Chunks slice the data to get their payloads, a memoryview turns those
+        # slices into views instead of copies.
+        data = memoryview(data).cast('B')
         head = Header(data)
         data_offset = Header.header_size
         frames = []
-        layer_index = 0
-        supported_chunks = (
-            OldPaleteChunk_0x0004,
-            OldPaleteChunk_0x0011,
-            LayerChunk,
-            CelChunk,
-            CelExtraChunk,
-            ColorProfileChunk,
-            MaskChunk,
-            FrameTagsChunk,
-            PathChunk,
-            PaletteChunk,
-            UserDataChunk,
-            SliceChunk,
-            TilesetChunk
-        )
+        context = ParseContext(lazy, cel_cache, color_depth=head.color_depth, decode_workers=decode_workers, stats=stats)
         for i in range(head.num_frames):
-            frame = Frame(data, data_offset)
+            frame = parse_frame(data, data_offset, context)
             frames.append(frame)
-            frame.chunks = []
-            data_offset += frame.frame_size
-            for c in range(frame.num_chunks):
-                chunk = Chunk(data, data_offset)
-                print(vars(chunk))
-                found_chunk_type = None
-                for chunk_type in supported_chunks:
-                    if chunk_type.chunk_id == chunk.chunk_type:
-                        found_chunk_type = chunk_type
-                        break
-
-                if not found_chunk_type:
-                    print("Skipped 0x{:04x}".format(chunk.chunk_type))
-                elif found_chunk_type == LayerChunk:
-                    layer = LayerChunk(data, layer_index, data_offset)
-                    if layer.layer_type == 0 or layer.layer_type == 2:
-                        frame.chunks.append(layer)
-                    elif layer.layer_type == 1:
-                        frame.chunks.append(LayerGroupChunk(layer))
-                    else:
-                        print("Skipped layer chunk with unsupported layer type 0x{:04x}".format(layer.layer_type))
-                        layer_index += 1
-                else:
-                    frame.chunks.append(found_chunk_type(data, data_offset))
-
-                data_offset += chunk.chunk_size
+            data_offset += frame.size
+        context.decompress_pending()
 
         return head, frames
@@ -0,0 +1,106 @@
+import asyncio
+import weakref
+from functools import partial
+
+from . import AsepriteFile
+from .render import IncrementalRenderer, render_frame as render_frame_sync
+from .stream import StreamReader
+
+
+class JobLimiter(object):
+    """Bounds how many blocking jobs run at once, across every caller of this module.
+
+    Each job (reading a file, parsing a frame, rendering a frame) takes a
+    slot for its duration only, so that a large file being loaded doesn't
+    hold the others back between its frames. The semaphores are created per
+    event loop, on first use.
+    """
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        # Event loop -> semaphore
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self.semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self.semaphores[loop] = asyncio.Semaphore(self.max_jobs)
+        return semaphore
+
+    async def run(self, executor, function, *args, **kwargs):
+        """Runs function in executor (the loop's default one if None) once a slot is free."""
+        async with self.semaphore():
+            return await asyncio.get_running_loop().run_in_executor(executor, partial(function, *args, **kwargs))
+
+
+# Shared by all the requests, see set_max_jobs().
+limiter = JobLimiter(4)
+
+
+def set_max_jobs(max_jobs):
+    """Sets how many jobs can run at once. Event loops that already ran jobs keep their limit."""
+    global limiter
+    limiter = JobLimiter(max_jobs)
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def load(path, lazy=False, cel_cache_size=None, decode_workers=None, executor=None):
+    """Reads and parses the file at path without blocking the event loop.
+
+    The file is read, then its frames are parsed (and their cels
+    decompressed, unless lazy is set) one at a time in executor, the event
+    loop running other tasks between them. See AsepriteFile for the other
+    arguments.
+    """
+    data = await limiter.run(executor, read_file, path)
+    # Parses the header and the first frame, the other ones are parsed below.
+    parsed_file = await limiter.run(executor, AsepriteFile, data, lazy, cel_cache_size, False, None, decode_workers)
+    for frame_index in range(1, parsed_file.header.num_frames):
+        await asyncio.sleep(0)
+        await limiter.run(executor, parsed_file.frame, frame_index)
+    return parsed_file
+
+
+async def iter_frames(path, lazy=False, decode_workers=None, resolve_links=False, executor=None):
+    """Asynchronously yields the frames of the file at path, as StreamReader does.
+
+    Each frame is read and parsed in executor once the previous one has
+    been consumed.
+    """
+    fileobj = await limiter.run(executor, open, path, 'rb')
+    try:
+        reader = await limiter.run(executor, StreamReader, fileobj, lazy, decode_workers, resolve_links)
+        while True:
+            frame = await limiter.run(executor, next, reader, None)
+            if frame is None:
+                return
+            yield frame
+            await asyncio.sleep(0)
+    finally:
+        fileobj.close()
+
+
+async def render_frame(parsed_file, frame_index, region=None, executor=None):
+    """Renders a frame in executor, see render.render_frame."""
+    return await limiter.run(executor, render_frame_sync, parsed_file, frame_index, region)
+
+
+async def play(parsed_file, frame_indices=None, executor=None):
+    """Asynchronously yields the (frame index, canvas, updated rectangles) of frames rendered in executor.
+
+    See IncrementalRenderer.play: the canvas is the same array for all the
+    frames, updated in place once the previous one has been consumed.
+    """
+    # Builds the palette and tileset tables off the loop as well
+    renderer = await limiter.run(executor, IncrementalRenderer, parsed_file)
+    if frame_indices is None:
+        frame_indices = range(parsed_file.header.num_frames)
+    for frame_index in frame_indices:
+        (canvas, rects) = await limiter.run(executor, renderer.render, frame_index)
+        yield (frame_index, canvas, rects)
+        await asyncio.sleep(0)
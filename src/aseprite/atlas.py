@@ -0,0 +1,303 @@
+import hashlib
+import json
+from typing import NamedTuple
+
+from .chunks import FrameTagsChunk, SliceChunk, require_numpy
+from .bounds import mask_box
+from .render import frame_cels, pixels_to_rgba, tileset_tiles, tilemap_pixels, palette_lut
+
+# FrameTag.loop -> animation direction, as named by Aseprite's JSON export
+tag_directions = {
+    0: 'forward',
+    1: 'reverse',
+    2: 'pingpong',
+    3: 'pingpong_reverse'
+}
+
+
+class AtlasFrame(NamedTuple):
+    """Placement of a sprite frame (or cel) in the atlas."""
+    name: str
+    sprite: str
+    frame_index: int
+    # Layer name in 'cels' mode, None in 'frames' mode
+    layer: object
+    page: int
+    # Rectangle in the page
+    x: int
+    y: int
+    width: int
+    height: int
+    # Offset of the trimmed image in the untrimmed one, and the latter's size
+    offset_x: int
+    offset_y: int
+    source_width: int
+    source_height: int
+    duration: int
+
+
+class SkylinePacker(object):
+    """Bottom-left skyline packer filling one page of a fixed size.
+
+    The skyline is the list of (x, y, width) segments of the top edge of the
+    placed rectangles. A rectangle is placed where its bottom is the lowest,
+    then leftmost.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.skyline = [(0, 0, width)]
+
+    def fit(self, index, width, height):
+        """Returns the y a rectangle starting at the segment index would be placed at, or None."""
+        x = self.skyline[index][0]
+        if x + width > self.width:
+            return None
+        y = 0
+        remaining = width
+        while remaining > 0:
+            (_, segment_y, segment_width) = self.skyline[index]
+            y = max(y, segment_y)
+            if y + height > self.height:
+                return None
+            remaining -= segment_width
+            index += 1
+        return y
+
+    def insert(self, width, height):
+        """Places a rectangle, returning its (x, y), or None if it doesn't fit in the page."""
+        best = None
+        for index, (x, _, _) in enumerate(self.skyline):
+            y = self.fit(index, width, height)
+            if y is not None and (best is None or (y + height, x) < (best[1] + height, best[0])):
+                best = (x, y, index)
+        if best is None:
+            return None
+        (x, y, index) = best
+
+        # Replace the segments covered by the rectangle by its top edge
+        right = x + width
+        self.skyline.insert(index, (x, y + height, width))
+        index += 1
+        while index < len(self.skyline) and self.skyline[index][0] < right:
+            (segment_x, segment_y, segment_width) = self.skyline[index]
+            if segment_x + segment_width <= right:
+                del self.skyline[index]
+            else:
+                self.skyline[index] = (right, segment_y, segment_x + segment_width - right)
+                break
+        # Merge the neighbours at the same height
+        merged = [self.skyline[0]]
+        for segment in self.skyline[1:]:
+            if segment[1] == merged[-1][1]:
+                merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + segment[2])
+            else:
+                merged.append(segment)
+        self.skyline = merged
+        return (x, y)
+
+
+def trim_box(image):
+    """Returns the (x, y, width, height) bounding box of an RGBA image's non-transparent pixels."""
+    return mask_box(image[..., 3] != 0) or (0, 0, 0, 0)
+
+
+def cel_image(parsed_file, cel, layer, lut, tilesets):
+    """Returns a cel's pixels as a (height, width, 4) uint8 RGBA array, or None if it has none."""
+    np = require_numpy()
+    if cel.cel_type == 3:
+        tiles = tilesets.get(layer.tileset_index)
+        if tiles is None:
+            return None
+        pixels = tilemap_pixels(cel, tiles)
+    elif cel.cel_type in (0, 2):
+        pixels = cel.to_numpy(parsed_file.header.color_depth)
+    else:
+        return None
+    if parsed_file.header.color_depth == 32:
+        return pixels
+    return np.round(pixels_to_rgba(parsed_file, pixels, layer, lut) * 255).astype(np.uint8)
+
+
+class Atlas(object):
+    """Sprite frames or cels packed into texture pages.
+
+    pages holds the pages as (height, width, 4) uint8 RGBA arrays and frames
+    an AtlasFrame per packed image, in the files' order. Identical images
+    share the same rectangle.
+    """
+
+    def __init__(self, pages, frames, sprites):
+        self.pages = pages
+        self.frames = frames
+        # Sprite name -> metadata (size, tags, slices)
+        self.sprites = sprites
+
+    def to_dict(self):
+        """Returns the atlas' metadata, in the spirit of Aseprite's JSON export."""
+        frames = []
+        for frame in self.frames:
+            frames.append({
+                'filename': frame.name,
+                'sprite': frame.sprite,
+                'frameIndex': frame.frame_index,
+                'layer': frame.layer,
+                'page': frame.page,
+                'frame': {'x': frame.x, 'y': frame.y, 'w': frame.width, 'h': frame.height},
+                'rotated': False,
+                'trimmed': (frame.width, frame.height) != (frame.source_width, frame.source_height),
+                'spriteSourceSize': {'x': frame.offset_x, 'y': frame.offset_y, 'w': frame.width, 'h': frame.height},
+                'sourceSize': {'w': frame.source_width, 'h': frame.source_height},
+                'duration': frame.duration
+            })
+        pages = [{'size': {'w': page.shape[1], 'h': page.shape[0]}} for page in self.pages]
+        return {'frames': frames, 'meta': {'pages': pages, 'sprites': self.sprites}}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+def sprite_metadata(parsed_file):
+    tags = []
+    slices = []
+    for frame in parsed_file.frames:
+        for chunk in frame.chunks:
+            if isinstance(chunk, FrameTagsChunk):
+                for tag in chunk.tags:
+                    tags.append({
+                        'name': tag.name,
+                        'from': tag.from_frame,
+                        'to': tag.to_frame,
+                        'direction': tag_directions.get(tag.loop, 'forward'),
+                        'color': '#{:02x}{:02x}{:02x}'.format(*tag.color)
+                    })
+            elif isinstance(chunk, SliceChunk):
+                keys = []
+                for key in chunk.slices:
+                    slice_key = {
+                        'frame': key.start_frame,
+                        'bounds': {'x': key.x, 'y': key.y, 'w': key.width, 'h': key.height}
+                    }
+                    if key.center is not None:
+                        slice_key['center'] = {'x': key.center.x, 'y': key.center.y, 'w': key.center.width, 'h': key.center.height}
+                    if key.pivot is not None:
+                        slice_key['pivot'] = {'x': key.pivot.x, 'y': key.pivot.y}
+                    keys.append(slice_key)
+                slices.append({'name': chunk.name, 'keys': keys})
+    return {
+        'size': {'w': parsed_file.header.width, 'h': parsed_file.header.height},
+        'frameTags': tags,
+        'slices': slices
+    }
+
+
+def collect_images(parsed_file, mode):
+    """Yields the (frame index, layer name, identity, image producer) of the images to pack.
+
+    Images with the same identity are the same, whatever their content, so
+    that linked cels (and frames only made of linked cels) are only rendered
+    and hashed once.
+    """
+    if mode == 'frames':
+        for frame_index in range(parsed_file.header.num_frames):
+            cels = frame_cels(parsed_file, frame_index)
+            identity = tuple(sorted((layer_index, id(cel)) for layer_index, cel in cels.items()))
+            yield (frame_index, None, identity, lambda frame_index=frame_index: parsed_file.render_frame(frame_index))
+        return
+
+    lut = palette_lut(parsed_file) if parsed_file.header.color_depth == 8 else None
+    tilesets = tileset_tiles(parsed_file)
+    for frame_index in range(parsed_file.header.num_frames):
+        cels = frame_cels(parsed_file, frame_index)
+        for layer in parsed_file.layers:
+            cel = cels.get(layer.layer_index)
+            if cel is None:
+                continue
+            yield (frame_index, layer.name, (id(cel),),
+                   lambda cel=cel, layer=layer: cel_image(parsed_file, cel, layer, lut, tilesets))
+
+
+def build_atlas(files, mode='frames', page_width=2048, page_height=2048, padding=1, trim=True):
+    """Packs the frames of parsed files into texture pages.
+
+    files maps sprite names to AsepriteFile instances. In 'frames' mode the
+    flattened frames are packed, in 'cels' mode every cel of every layer is,
+    named after its layer. Transparent borders are trimmed if trim is set.
+    Identical images are packed once: linked cels are recognized as such, the
+    other images by a hash of their pixels. padding is the space left
+    between the images. Requires NumPy.
+    """
+    np = require_numpy()
+    if mode not in ('frames', 'cels'):
+        raise ValueError("Unknown atlas mode '{}'".format(mode))
+
+    # Unique trimmed images, and the entries pointing to them with their own
+    # trim offset and untrimmed size: the same image can be trimmed from
+    # different places.
+    images = []
+    entries = []
+    sprites = {}
+    # Image hash -> image index, shared by all the files
+    by_hash = {}
+    for name, parsed_file in files.items():
+        sprites[name] = sprite_metadata(parsed_file)
+        by_identity = {}
+        for (frame_index, layer_name, identity, produce) in collect_images(parsed_file, mode):
+            placed = by_identity.get(identity)
+            if placed is None:
+                image = produce()
+                if image is None:
+                    continue
+                box = trim_box(image) if trim else (0, 0, image.shape[1], image.shape[0])
+                (x, y, width, height) = box
+                trimmed = np.ascontiguousarray(image[y:y + height, x:x + width])
+                digest = hashlib.blake2b(trimmed.data, digest_size=16).digest() + bytes(str(trimmed.shape), 'ascii')
+                image_index = by_hash.get(digest)
+                if image_index is None:
+                    image_index = by_hash[digest] = len(images)
+                    images.append(trimmed)
+                placed = by_identity[identity] = (image_index, x, y, image.shape[1], image.shape[0])
+            entry_name = name if layer_name is None else '{} ({})'.format(name, layer_name)
+            duration = parsed_file.frame(frame_index).frame_duration
+            entries.append(('{} {}'.format(entry_name, frame_index), name, frame_index, layer_name, duration) + placed)
+
+    # Tallest images first, which suits the skyline
+    placements = [None] * len(images)
+    packers = []
+    order = sorted(range(len(images)), key=lambda index: (-images[index].shape[0], -images[index].shape[1]))
+    for image_index in order:
+        (height, width) = images[image_index].shape[:2]
+        if width == 0 or height == 0:
+            placements[image_index] = (0, 0, 0)
+            continue
+        if width + padding > page_width or height + padding > page_height:
+            raise ValueError('Image of {}x{} pixels larger than the {}x{} pages'.format(width, height, page_width, page_height))
+        for page, packer in enumerate(packers):
+            position = packer.insert(width + padding, height + padding)
+            if position is not None:
+                break
+        else:
+            page = len(packers)
+            packers.append(SkylinePacker(page_width, page_height))
+            position = packers[page].insert(width + padding, height + padding)
+        placements[image_index] = (page,) + position
+
+    # Crop the pages to their content
+    page_sizes = [[0, 0] for _ in packers]
+    for image, (page, x, y) in zip(images, placements):
+        if image.size:
+            page_sizes[page][0] = max(page_sizes[page][0], x + image.shape[1])
+            page_sizes[page][1] = max(page_sizes[page][1], y + image.shape[0])
+    pages = [np.zeros((height, width, 4), dtype=np.uint8) for width, height in page_sizes]
+    for image, (page, x, y) in zip(images, placements):
+        if image.size:
+            pages[page][y:y + image.shape[0], x:x + image.shape[1]] = image
+
+    frames = []
+    for (entry_name, name, frame_index, layer_name, duration, image_index, offset_x, offset_y, source_width, source_height) in entries:
+        (height, width) = images[image_index].shape[:2]
+        (page, x, y) = placements[image_index]
+        frames.append(AtlasFrame(entry_name, name, frame_index, layer_name, page, x, y, width, height,
+                                 offset_x, offset_y, source_width, source_height, duration))
+    return Atlas(pages, frames, sprites)
@@ -0,0 +1,91 @@
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import AsepriteFile
+from .chunks import FrameTagsChunk, SliceChunk
+
+
+class BatchResult(object):
+    """Outcome of loading one file of a batch.
+
+    value holds the projection of the parsed file, or None if loading it
+    failed, in which case error holds the error's description.
+    """
+
+    def __init__(self, index, path, value=None, error=None):
+        # Position of the path in the paths given to load_many
+        self.index = index
+        self.path = path
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def project_file(parsed_file):
+    return parsed_file
+
+def project_header(parsed_file):
+    return parsed_file.header
+
+def project_layers(parsed_file):
+    return parsed_file.layers
+
+def project_tags(parsed_file):
+    return [tag for chunk in parsed_file.frame(0).chunks if isinstance(chunk, FrameTagsChunk) for tag in chunk.tags]
+
+def project_slices(parsed_file):
+    return [chunk for frame in parsed_file.frames for chunk in frame.chunks if isinstance(chunk, SliceChunk)]
+
+def project_frames(parsed_file):
+    return [parsed_file.render_frame(frame_index) for frame_index in range(parsed_file.header.num_frames)]
+
+# Projections selectable by name in load_many
+projections = {
+    'file': project_file,
+    'header': project_header,
+    'layers': project_layers,
+    'tags': project_tags,
+    'slices': project_slices,
+    'frames': project_frames,
+}
+
+
+def load_file(index, path, projection='file', lazy=True):
+    """Loads a file and applies a projection to it, catching any error."""
+    try:
+        if not callable(projection):
+            projection = projections[projection]
+        with AsepriteFile.open(path, lazy=lazy) as parsed_file:
+            value = projection(parsed_file)
+        return BatchResult(index, path, value)
+    except Exception as e:
+        error = '{}: {}\n{}'.format(type(e).__name__, e, traceback.format_exc())
+        return BatchResult(index, path, error=error)
+
+
+def load_many(paths, workers=None, projection='file', lazy=True):
+    """Parses files across a pool of processes, yielding a BatchResult per file as they complete.
+
+    projection is either the name of one of the projections ('file',
+    'header', 'layers', 'tags', 'slices' or 'frames') or a picklable
+    function taking the parsed file, whose result is sent back instead of
+    the whole file. Errors are reported in the results instead of stopping
+    the batch. workers defaults to the number of CPUs, 0 loads the files in
+    the current process.
+
+    Parsed files are sent back with their cels still compressed, they're
+    decompressed on first access.
+    """
+    if workers == 0:
+        for index, path in enumerate(paths):
+            yield load_file(index, path, projection, lazy)
+        return
+
+    with ProcessPoolExecutor(workers or os.cpu_count()) as executor:
+        futures = [executor.submit(load_file, index, path, projection, lazy) for index, path in enumerate(paths)]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,164 @@
+from typing import Any, NamedTuple
+
+from .chunks import require_numpy
+from .palette import indexed_lut
+from .render import LAYER_BACKGROUND, frame_cels, layers_by_index, tileset_tiles, tilemap_pixels
+
+
+class CelAlpha(NamedTuple):
+    """Bounding box of a cel's non-transparent pixels, in canvas coordinates."""
+    x: int
+    y: int
+    width: int
+    height: int
+    # (height, (width + 7) // 8) uint8 array of the box's pixels, one bit per
+    # pixel, most significant bit first: mask.tobytes() is laid out like
+    # MaskChunk.bitmap. None unless requested.
+    mask: Any
+
+
+def mask_box(mask):
+    """Returns the (x, y, width, height) bounding box of a 2D boolean array's set values, or None if there's none."""
+    np = require_numpy()
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    columns = np.flatnonzero(mask.any(axis=0))
+    return (int(columns[0]), int(rows[0]), int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1))
+
+
+def pack_mask(mask):
+    """Packs a 2D boolean array into bits, rows padded to whole bytes as in MaskChunk.bitmap."""
+    np = require_numpy()
+    return np.packbits(mask, axis=1)
+
+
+def unpack_mask(bitmap, width, height):
+    """Unpacks a MaskChunk-like bitmap into a (height, width) boolean array."""
+    np = require_numpy()
+    bits = np.frombuffer(bitmap, dtype=np.uint8).reshape(height, (width + 7) // 8)
+    return np.unpackbits(bits, axis=1, count=width).astype(bool)
+
+
+class AlphaIndex(object):
+    """Opacity of a file's cels, answering which layers cover which pixels.
+
+    The bounding box (and, when needed, the 1-bit mask) of each cel is
+    computed on first use and kept: linked cels share their source's, and
+    later queries only test boxes and read bits. A pixel is opaque when its
+    alpha isn't 0; indexed pixels take the alpha of their palette color, the
+    transparent index being transparent except on the background layer.
+    Requires NumPy.
+    """
+
+    def __init__(self, parsed_file):
+        self.parsed_file = parsed_file
+        # Layer index -> layer
+        self.layers = layers_by_index(parsed_file)
+        # Source cel -> CelAlpha, None if the cel has no opaque pixel
+        self.cels = {}
+        # Frame index -> [(layer index, CelAlpha)], bottom layer first
+        self.frames = {}
+        self.tilesets = None
+        # Background flag -> palette index -> opaque
+        self.palette_alpha = {}
+
+    def cel_pixels(self, cel, layer):
+        """Returns the boolean opacity of a resolved cel's pixels, or None if it has no pixels."""
+        parsed_file = self.parsed_file
+        if cel.cel_type == 3:
+            if self.tilesets is None:
+                self.tilesets = tileset_tiles(parsed_file)
+            tiles = self.tilesets.get(layer.tileset_index)
+            if tiles is None:
+                return None
+            pixels = tilemap_pixels(cel, tiles)
+        elif cel.cel_type in (0, 2):
+            pixels = cel.to_numpy(parsed_file.header.color_depth)
+        else:
+            return None
+
+        depth = parsed_file.header.color_depth
+        if depth == 32:
+            return pixels[..., 3] != 0
+        if depth == 16:
+            return pixels[..., 1] != 0
+        background = bool(layer.flags & LAYER_BACKGROUND)
+        opaque = self.palette_alpha.get(background)
+        if opaque is None:
+            opaque = self.palette_alpha[background] = indexed_lut(parsed_file, not background)[:, 3] != 0
+        return opaque[pixels]
+
+    def cel_alpha(self, layer_index, frame_index, mask=False):
+        """Returns the CelAlpha of a layer's cel at a frame, or None if it has no opaque pixel.
+
+        With mask set, the returned CelAlpha holds the packed mask as well.
+        """
+        cel = frame_cels(self.parsed_file, frame_index).get(layer_index)
+        layer = self.layers.get(layer_index)
+        if cel is None or layer is None:
+            return None
+        return self.source_alpha(cel, layer, mask)
+
+    def source_alpha(self, cel, layer, mask=False):
+        if cel in self.cels:
+            alpha = self.cels[cel]
+            if alpha is None or alpha.mask is not None or not mask:
+                return alpha
+        opaque = self.cel_pixels(cel, layer)
+        box = mask_box(opaque) if opaque is not None else None
+        if box is None:
+            alpha = None
+        else:
+            (x, y, width, height) = box
+            bits = pack_mask(opaque[y:y + height, x:x + width]) if mask else None
+            alpha = CelAlpha(cel.x_pos + x, cel.y_pos + y, width, height, bits)
+        self.cels[cel] = alpha
+        return alpha
+
+    def frame_alpha(self, frame_index):
+        """Returns the (layer index, CelAlpha with its mask) of a frame's layers with opaque pixels, bottom first."""
+        alphas = self.frames.get(frame_index)
+        if alphas is None:
+            alphas = []
+            for layer_index, cel in sorted(frame_cels(self.parsed_file, frame_index).items()):
+                layer = self.layers.get(layer_index)
+                # Linked cels whose source is missing are None
+                if cel is None or layer is None:
+                    continue
+                alpha = self.source_alpha(cel, layer, True)
+                if alpha is not None:
+                    alphas.append((layer_index, alpha))
+            self.frames[frame_index] = alphas
+        return alphas
+
+    def layers_at(self, frame_index, x, y):
+        """Returns the indices of the layers with an opaque pixel at (x, y) in a frame, bottom first."""
+        layer_indices = []
+        for layer_index, alpha in self.frame_alpha(frame_index):
+            column = x - alpha.x
+            row = y - alpha.y
+            if 0 <= column < alpha.width and 0 <= row < alpha.height:
+                if alpha.mask[row, column >> 3] & (0x80 >> (column & 7)):
+                    layer_indices.append(layer_index)
+        return layer_indices
+
+    def opaque_at(self, frame_index, xs, ys):
+        """Tests many points at once.
+
+        Returns a (num_points, num_layers) boolean array telling whether each
+        layer has an opaque pixel at each (xs[i], ys[i]) point of a frame,
+        its columns being the layer indices.
+        """
+        np = require_numpy()
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        opaque = np.zeros((len(xs), max(self.layers, default=-1) + 1), dtype=bool)
+        for layer_index, alpha in self.frame_alpha(frame_index):
+            columns = xs - alpha.x
+            rows = ys - alpha.y
+            inside = np.flatnonzero((columns >= 0) & (columns < alpha.width) & (rows >= 0) & (rows < alpha.height))
+            columns = columns[inside]
+            bits = alpha.mask[rows[inside], columns >> 3] & (0x80 >> (columns & 7))
+            opaque[inside, layer_index] = bits != 0
+        return opaque
@@ -0,0 +1,226 @@
+import hashlib
+import io
+import mmap
+import os
+import pickle
+from struct import Struct
+
+from . import AsepriteFile
+from .chunks import CelChunk, TilesetChunk, slot_values
+from .parser import parser_version
+
+
+class StoredBuffer(object):
+    """Location of a decoded buffer in a cache entry."""
+    __slots__ = ('offset', 'length')
+
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.length = length
+
+
+class EntryPickler(pickle.Pickler):
+    """Pickles a parsed file, writing the decoded cel and tileset data aside.
+
+    The decoded buffers are written to the entry file as they're met, the
+    pickled metadata only refers to their location.
+    """
+
+    def __init__(self, metadata_file, entry_file, first_offset):
+        pickle.Pickler.__init__(self, metadata_file, pickle.HIGHEST_PROTOCOL)
+        self.entry_file = entry_file
+        self.next_offset = first_offset
+
+    def store(self, buffer):
+        padding = -self.next_offset % AssetCache.alignment
+        self.entry_file.write(bytes(padding))
+        self.entry_file.write(buffer)
+        stored = StoredBuffer(self.next_offset + padding, len(buffer))
+        self.next_offset = stored.offset + stored.length
+        return stored
+
+    def persistent_id(self, obj):
+        if isinstance(obj, StoredBuffer):
+            return (obj.offset, obj.length)
+        return None
+
+    def reducer_override(self, obj):
+        if isinstance(obj, CelChunk) and obj.source is not None:
+            state = slot_values(obj)
+            properties = dict.copy(obj.data)
+            properties['data'] = self.store(obj.get_data())
+            state.update(data=properties, cache=None, source=None, payload_offset=0, payload_length=0)
+            return (CelChunk.__new__, (CelChunk,), state)
+        if isinstance(obj, TilesetChunk) and obj.compressed_data is not None:
+            state = slot_values(obj)
+            state.update(compressed_data=None, decompressed_data=self.store(obj.tileset_image))
+            return (TilesetChunk.__new__, (TilesetChunk,), state)
+        return NotImplemented
+
+
+class EntryUnpickler(pickle.Unpickler):
+    """Unpickles a parsed file, its decoded buffers viewing the entry's mapping."""
+
+    def __init__(self, metadata_file, view):
+        pickle.Unpickler.__init__(self, metadata_file)
+        self.view = view
+        # Views handed out, released if loading fails
+        self.buffers = []
+
+    def persistent_load(self, pid):
+        (offset, length) = pid
+        buffer = self.view[offset:offset + length]
+        self.buffers.append(buffer)
+        return buffer
+
+    def release(self):
+        for buffer in self.buffers:
+            buffer.release()
+        self.buffers = []
+
+
+class AssetCache(object):
+    """On-disk cache of parsed files, keyed by their content's hash and the parser version.
+
+    An entry holds the decoded cel and tileset data followed by the pickled
+    rest of the parsed file. Loading an entry memory-maps it: only the
+    metadata is read, the pixels are paged in when accessed. Once the total
+    size of the entries exceeds max_size bytes, the least recently used ones
+    are removed.
+
+    Entries don't depend on the registered chunk handlers: after replacing a
+    built-in handler, use another cache directory or clear() the cache.
+    """
+    entry_magic = b'ASEC'
+    entry_version = 1
+    entry_suffix = '.asec'
+    entry_head_format = (
+        '<4s' # Magic
+        + 'H' # Entry format version
+        + '2x'
+        + 'Q' # Metadata offset
+        + 'Q' # Metadata size
+    )
+    entry_head_struct = Struct(entry_head_format)
+    # Decoded buffers are aligned for NumPy's sake
+    alignment = 16
+
+    def __init__(self, directory, max_size=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data):
+        """Returns the cache key of a file's content."""
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        return '{}-{}'.format(digest, parser_version)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + AssetCache.entry_suffix)
+
+    def open(self, path, decode_workers=None):
+        """Returns the parsed file at path, from the cache if it holds it, parsing and storing it otherwise.
+
+        Files loaded from the cache keep their entry mapped until close() is
+        called, like files opened with AsepriteFile.open().
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        key = AssetCache.key(data)
+        parsed_file = self.get(key)
+        if parsed_file is None:
+            parsed_file = AsepriteFile(data, decode_workers=decode_workers)
+            self.put(key, parsed_file)
+        return parsed_file
+
+    def get(self, key):
+        """Loads the parsed file stored under key, or returns None if there's none."""
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'rb') as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty file, which can't be mapped
+            return None
+        view = memoryview(mapping)
+        unpickler = None
+        try:
+            (magic, version, metadata_offset, metadata_size) = AssetCache.entry_head_struct.unpack_from(view, 0)
+            if magic != AssetCache.entry_magic or version != AssetCache.entry_version:
+                raise ValueError('Unsupported cache entry')
+            metadata = io.BytesIO(view[metadata_offset:metadata_offset + metadata_size].tobytes())
+            unpickler = EntryUnpickler(metadata, view)
+            parsed_file = unpickler.load()
+        except Exception:
+            # The partly unpickled objects may still hold views on the mapping.
+            if unpickler is not None:
+                unpickler.release()
+            view.release()
+            mapping.close()
+            os.remove(entry_path)
+            return None
+        # The buffers hold their own exports of the mapping.
+        view.release()
+        parsed_file.mapping = mapping
+        # Marks the entry as recently used for the eviction.
+        os.utime(entry_path)
+        return parsed_file
+
+    def put(self, key, parsed_file):
+        """Stores a parsed file under key, then evicts the least recently used entries if needed."""
+        head_struct = AssetCache.entry_head_struct
+        metadata = io.BytesIO()
+        # Unlike tempfile's, which only their owner can read, the entry is
+        # created with the process' default mode so that it can be shared.
+        temporary_path = os.path.join(self.directory, '{}.{}.tmp'.format(key, os.urandom(8).hex()))
+        fd = os.open(temporary_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, 'O_BINARY', 0), 0o666)
+        with os.fdopen(fd, 'wb') as f:
+            try:
+                f.write(bytes(head_struct.size))
+                pickler = EntryPickler(metadata, f, head_struct.size)
+                pickler.dump(parsed_file)
+                metadata_offset = pickler.next_offset
+                f.write(metadata.getbuffer())
+                f.seek(0)
+                f.write(head_struct.pack(AssetCache.entry_magic, AssetCache.entry_version, metadata_offset, len(metadata.getbuffer())))
+            except:
+                f.close()
+                os.remove(temporary_path)
+                raise
+        os.replace(temporary_path, self.entry_path(key))
+        self.evict()
+
+    def entries(self):
+        """Returns the (last use time, size, path) of the entries, the least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(AssetCache.entry_suffix):
+                entry_path = os.path.join(self.directory, name)
+                try:
+                    entry_stat = os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Removes the least recently used entries until they fit in max_size."""
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        for _, _, entry_path in self.entries():
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
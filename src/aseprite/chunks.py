@@ -1,75 +1,214 @@
-import struct
 from struct import Struct
+import logging
+import sys
 import zlib
-import math
+from array import array
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional, List
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+uint16_struct = Struct('<H')
+uint32_struct = Struct('<I')
+
+# Color depth (bits per pixel) -> channels per pixel
+color_depth_channels = {
+    32: 4, # RGBA
+    16: 2, # Grayscale (value, alpha)
+    8: 1 # Indexed
+}
+# Bits per tile -> (NumPy dtype, array typecode)
+tile_types = {
+    32: ('<u4', 'I'),
+    16: ('<u2', 'H'),
+    8: ('u1', 'B')
+}
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError('This feature requires NumPy, install it with `pip install py-aseprite[numpy]`')
+    return numpy
+
+def slot_values(obj):
+    """Returns the attributes of an object whose class uses __slots__, as a dict."""
+    values = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                values[name] = getattr(obj, name)
+    return values
+
+
+class RGBColor(NamedTuple):
+    red: int
+    green: int
+    blue: int
+
+
+class PaletteColor(NamedTuple):
+    flags: int
+    red: int
+    green: int
+    blue: int
+    alpha: int
+    name: Optional[str]
+
+
+class OldPalettePacket(NamedTuple):
+    previous_packet_skip: int
+    colors: List[RGBColor]
+
+
+class ExternalFile(NamedTuple):
+    id: int
+    type: int # 0: palette, 1: tileset, 2: properties extension, 3: tile management extension
+    name: str # File name or extension ID
+
+
+class FrameTag(NamedTuple):
+    from_frame: int
+    to_frame: int
+    loop: int
+    color: RGBColor
+    name: str
+
+
+class SliceCenter(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class SlicePivot(NamedTuple):
+    x: int
+    y: int
+
+
+class SliceKey(NamedTuple):
+    start_frame: int
+    x: int
+    y: int
+    width: int
+    height: int
+    center: Optional[SliceCenter]
+    pivot: Optional[SlicePivot]
+
+
+class TilemapTiles(NamedTuple):
+    """Tiles of a tilemap cel, as (height, width) NumPy arrays."""
+    ids: Any
+    flip_x: Any
+    flip_y: Any
+    flip_diagonal: Any
+
 
 # They're not 0-terminated strings, but they're prefixed with their size
 def parse_string(data, string_offset):
-    (string_length,) = Struct('<H').unpack_from(data, string_offset)
+    (string_length,) = uint16_struct.unpack_from(data, string_offset)
 
-    (string_name, ) = Struct('<{}s'.format(string_length)).unpack_from(data, string_offset+2)
+    string_name = bytes(data[string_offset + 2:string_offset + 2 + string_length])
     return (string_length + 2, string_name.decode('utf-8'))
 
 
 class Chunk(object):
     """Base class for all chunks."""
+    __slots__ = ('chunk_size', 'chunk_type')
     chunk_format = '<IH'
+    chunk_struct = Struct(chunk_format)
 
     def __init__(self, data, data_offset=0):
-        chunk_struct = Struct(Chunk.chunk_format)
+        chunk_struct = Chunk.chunk_struct
         (self.chunk_size, self.chunk_type) = chunk_struct.unpack_from(data, data_offset)
 
+    def detach(self):
+        """Copies any data still referencing the source buffer so it can be released."""
+        pass
+
+    def __getstate__(self):
+        # Views on the file's buffer can't be pickled, only send their data.
+        return {key: bytes(value) if isinstance(value, memoryview) else value for key, value in slot_values(self).items()}
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
 
 class OldPaleteChunk_0x0004(Chunk):
+    __slots__ = ('num_packets', 'packets')
     chunk_id = 0x0004
+    packet_format = '<BB'
+    color_packet_format = '<BBB'
+    packet_struct = Struct(packet_format)
+    color_packet_struct = Struct(color_packet_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
 
-        packet_struct = Struct('<BB')
-        color_packet_struct = Struct('<BBB')
-
-        (self.num_packets,) = Struct('<H').unpack_from(data, data_offset+6)
+        (self.num_packets,) = uint16_struct.unpack_from(data, data_offset+6)
         self.packets = []
 
         packet_offset = data_offset + 8
         for packet_index in range(self.num_packets):
-            packet = {'colors':[]}
-            (packet['previous_packet_skip'], num_colors) = packet_struct.unpack_from(data, packet_offset)
+            (previous_packet_skip, num_colors) = OldPaleteChunk_0x0004.packet_struct.unpack_from(data, packet_offset)
             packet_offset += 2
+            # 0 means 256 colors
+            num_colors = num_colors or 256
+            colors = []
             for color in range(0, num_colors):
-                (red, blue, green) = color_packet_struct.unpack_from(data, packet_offset)
-                packet['colors'].append([red, blue, green])
+                colors.append(RGBColor(*OldPaleteChunk_0x0004.color_packet_struct.unpack_from(data, packet_offset)))
                 packet_offset += 3
 
-            self.packets.append(packet)
+            self.packets.append(OldPalettePacket(previous_packet_skip, colors))
 
 
 class OldPaleteChunk_0x0011(Chunk):
+    __slots__ = ('num_packets', 'packets')
     chunk_id = 0x0011
+    packet_format = '<BB'
+    color_packet_format = '<BBB'
+    packet_struct = Struct(packet_format)
+    color_packet_struct = Struct(color_packet_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
 
-        packet_struct = Struct('<BB')
-        color_packet_struct = Struct('<BBB')
-        self.num_packets = Struct('<H').unpack_from(data, data_offset)
+        (self.num_packets,) = uint16_struct.unpack_from(data, data_offset+6)
         self.packets = []
 
-        packet_offset = data_offset + 6
+        packet_offset = data_offset + 8
         for packet_index in range(self.num_packets):
-            packet = {'colors':[]}
-            (packet.previous_packet_skip, num_colors) = packet_struct.unpack_from(data, packet_offset)
+            (previous_packet_skip, num_colors) = OldPaleteChunk_0x0011.packet_struct.unpack_from(data, packet_offset)
             packet_offset += 2
+            # 0 means 256 colors
+            num_colors = num_colors or 256
+            colors = []
             for color in range(0, num_colors):
-                (red, blue, green) = color_packet_struct.unpack_from(data, packet_offset)
-                packet['colors'].append([red, blue, green])
+                colors.append(RGBColor(*OldPaleteChunk_0x0011.color_packet_struct.unpack_from(data, packet_offset)))
                 packet_offset += 3
 
-            self.packets.append(packet)
+            self.packets.append(OldPalettePacket(previous_packet_skip, colors))
 
 
 class LayerChunk(Chunk):
+    __slots__ = (
+        'flags',
+        'layer_type',
+        'layer_child_level',
+        'default_width',
+        'default_height',
+        'blend_mode',
+        'opacity',
+        'name',
+        'layer_index',
+        'tileset_index'
+    )
     chunk_id = 0x2004
     layer_format = (
         '<H' # Flags
@@ -82,10 +221,12 @@ class LayerChunk(Chunk):
         + '3x' # Padding
     )
     layer_tileset_index_format = '<I'
+    layer_struct = Struct(layer_format)
+    layer_tileset_index_struct = Struct(layer_tileset_index_format)
 
     def __init__(self, data, layer_index, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        layer_struct = Struct(LayerChunk.layer_format)
+        layer_struct = LayerChunk.layer_struct
         (
             self.flags,
             self.layer_type,
@@ -100,13 +241,17 @@ class LayerChunk(Chunk):
 
         if self.layer_type == 2:
             layer_tileset_data_offset =  data_offset + 6 + layer_struct.size + name_data_length
-            layer_tileset_struct = Struct(LayerChunk.layer_tileset_index_format)
+            layer_tileset_struct = LayerChunk.layer_tileset_index_struct
             (self.tileset_index, ) = layer_tileset_struct.unpack_from(data, layer_tileset_data_offset)
 
 
 class LayerGroupChunk(LayerChunk):
+    __slots__ = ('children',)
+
     def __init__(self, base_layer : LayerChunk):
         """Constructed from its base version"""
+        self.chunk_size = base_layer.chunk_size
+        self.chunk_type = base_layer.chunk_type
         self.flags = base_layer.flags
         self.layer_type = base_layer.layer_type
         self.layer_child_level = base_layer.layer_child_level
@@ -119,7 +264,91 @@ class LayerGroupChunk(LayerChunk):
         self.children = []
 
 
+class CelData(dict):
+    """Dictionary holding a cel's properties.
+
+    When the cel was loaded lazily, its pixel (or tile) data is only extracted
+    the first time the 'data' key is read. Once resolved, a linked cel exposes
+    the properties and data of the cel it links to.
+    """
+    __slots__ = ('cel',)
+
+    def __init__(self, cel):
+        dict.__init__(self)
+        self.cel = cel
+
+    def __missing__(self, key):
+        if key == 'data' and self.cel.has_pending_data():
+            return self.cel.get_data()
+        if self.cel.link_source is not None:
+            return self.cel.link_source.data[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        if key == 'data' and self.cel.has_pending_data():
+            return True
+        if self.cel.link_source is not None and key in self.cel.link_source.data:
+            return True
+        return dict.__contains__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class CelCache(object):
+    """Bounded least-recently-used store of decompressed cel data.
+
+    Lazy cels sharing a cache don't keep their decompressed data around, they
+    fetch it from here and decompress it again once it has been evicted.
+    """
+    __slots__ = ('max_cels', 'entries')
+
+    def __init__(self, max_cels):
+        self.max_cels = max_cels
+        self.entries = OrderedDict()
+
+    def get(self, cel):
+        data = self.entries.get(cel)
+        if data is not None:
+            self.entries.move_to_end(cel)
+        return data
+
+    def put(self, cel, data):
+        self.entries[cel] = data
+        self.entries.move_to_end(cel)
+        while len(self.entries) > self.max_cels:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __getstate__(self):
+        # The cached data can be decompressed again, don't send it.
+        return {'max_cels': self.max_cels}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_cels'])
+
+
 class CelChunk(Chunk):
+    __slots__ = (
+        'layer_index',
+        'x_pos',
+        'y_pos',
+        'opacity',
+        'cel_type',
+        'color_depth',
+        'data',
+        'cache',
+        'link_source',
+        'source',
+        'payload_offset',
+        'payload_length',
+        'compressed'
+    )
     chunk_id = 0x2005
     cel_format = '<HhhBH7x'
     cel_type_format = '<HH'
@@ -134,10 +363,21 @@ class CelChunk(Chunk):
         'I' # Bitmask for diagonal flip ("swap X/y axis")
         '10x' # Reserved
     )
-
-    def __init__(self, data, data_offset=0):
+    cel_struct = Struct(cel_format)
+    cel_type_struct = Struct(cel_type_format)
+    cel_compressed_image_struct = Struct(cel_compressed_image_format)
+    cel_tilemap_struct = Struct(cel_tilemap_format)
+
+    def __init__(self, data, data_offset=0, lazy=False, cache=None, color_depth=None):
+        """If lazy is set, only the location of the pixel data is stored and the
+        data itself is extracted on first access to data['data'] or get_data().
+        A CelCache can be given to bound how many lazy cels keep their
+        decompressed data in memory at once.
+        color_depth is the file's header color depth, used by to_numpy().
+        """
         Chunk.__init__(self, data, data_offset)
-        cel_struct = Struct(CelChunk.cel_format)
+        self.color_depth = color_depth
+        cel_struct = CelChunk.cel_struct
         (
             self.layer_index,
             self.x_pos,
@@ -146,33 +386,37 @@ class CelChunk(Chunk):
             self.cel_type
         ) = cel_struct.unpack_from(data, data_offset + 6)
         cel_end_offset = data_offset + cel_struct.size + 6
-        self.data = {}
+        self.data = CelData(self)
+        self.cache = cache
+        # Cel a linked cel points to, set once the file is parsed.
+        self.link_source = None
+        # Location of the raw or compressed data in the source buffer.
+        self.source = None
+        self.payload_offset = 0
+        self.payload_length = 0
+        self.compressed = False
         # Raw Image Data (0)
         if self.cel_type == 0:
-            cel_type_struct = Struct(CelChunk.cel_type_format)
+            cel_type_struct = CelChunk.cel_type_struct
             (
                 self.data['width'],
                 self.data['height']
             ) = cel_type_struct.unpack_from(data, cel_end_offset)
-            start_range = cel_end_offset + cel_struct.size
-            end_range = data_offset + self.chunk_size
-            self.data['data'] = data[start_range:end_range]
+            self._locate_data(data, cel_end_offset + cel_type_struct.size, data_offset + self.chunk_size, False)
         # Linked Cel (1)
         elif self.cel_type == 1:
-            self.data = {'link': Struct('<H').unpack_from(data, cel_end_offset)}
+            (self.data['link'],) = uint16_struct.unpack_from(data, cel_end_offset)
         # Compressed Image (2)
         elif self.cel_type == 2:
-            cel_image_struct = Struct(CelChunk.cel_compressed_image_format)
+            cel_image_struct = CelChunk.cel_compressed_image_struct
             (
                 self.data['width'],
                 self.data['height']
             ) = cel_image_struct.unpack_from(data, cel_end_offset)
-            start_range = cel_end_offset + cel_image_struct.size
-            end_range = data_offset + self.chunk_size
-            self.data['data'] = zlib.decompress(data[start_range:end_range])
+            self._locate_data(data, cel_end_offset + cel_image_struct.size, data_offset + self.chunk_size, True)
         # Compressed Tilemap (3)
         elif self.cel_type == 3:
-            cel_tilemap_struct = Struct(CelChunk.cel_tilemap_format)
+            cel_tilemap_struct = CelChunk.cel_tilemap_struct
             cel_tilemap_offset = cel_end_offset
             (
                 self.data['width'],
@@ -183,38 +427,195 @@ class CelChunk(Chunk):
                 self.data['flip_y_bitmask'],
                 self.data['flip_diagonal_bitmask'],
             ) = cel_tilemap_struct.unpack_from(data, cel_tilemap_offset)
-            start_range = cel_tilemap_offset + cel_tilemap_struct.size
-            end_range = data_offset + self.chunk_size
-            self.data['data'] = zlib.decompress(data[start_range:end_range])
+            self._locate_data(data, cel_tilemap_offset + cel_tilemap_struct.size, data_offset + self.chunk_size, True)
             # Is there always width * height tiles or can the tile array be smaller than that.
         else:
-            print("Unsupported Cel chunk type {:04x}. Skipping.".format(self.cel_type))
+            logger.info('Unsupported cel type 0x%04x, its data is skipped', self.cel_type)
+
+        if not lazy and self.has_pending_data():
+            self.get_data()
+
+    def _locate_data(self, data, start_range, end_range, compressed):
+        self.source = data
+        self.payload_offset = start_range
+        self.payload_length = end_range - start_range
+        self.compressed = compressed
+
+    def has_pending_data(self):
+        """Returns True if the cel has pixel data that isn't loaded yet."""
+        return self.source is not None and not dict.__contains__(self.data, 'data')
+
+    def resolve_link(self, source):
+        """Makes a linked cel share the data of the cel it links to."""
+        # Don't chain links, point to the cel actually holding the data.
+        while source.link_source is not None:
+            source = source.link_source
+        self.link_source = source
+
+    def get_data(self):
+        """Returns the cel's raw pixel (or tile) data, extracting it if needed.
+
+        Linked cels return the very same data object as the cel they link to.
+        """
+        if self.link_source is not None:
+            return self.link_source.get_data()
+        if dict.__contains__(self.data, 'data'):
+            return dict.__getitem__(self.data, 'data')
+        if self.source is None:
+            return None
+        if self.cache is not None:
+            cached = self.cache.get(self)
+            if cached is not None:
+                return cached
+        payload = self.payload()
+        decoded = zlib.decompress(payload) if self.compressed else payload
+        self.set_data(decoded)
+        return decoded
+
+    def payload(self):
+        """Returns the raw or compressed data, as stored in the file."""
+        return self.source[self.payload_offset:self.payload_offset + self.payload_length]
+
+    def set_data(self, decoded):
+        """Stores the extracted pixel data, in the cel cache if there is one."""
+        if self.cache is not None:
+            self.cache.put(self, decoded)
+        else:
+            dict.__setitem__(self.data, 'data', decoded)
+
+    def replace_data(self, decoded):
+        """Replaces the cel's pixel (or tile) data.
+
+        The payload read from the file is dropped, so writers compress the
+        new data instead of copying it.
+        """
+        if self.link_source is not None:
+            raise ValueError("Cannot replace a linked cel's data, replace its source's")
+        if self.cache is not None:
+            self.cache.entries.pop(self, None)
+        self.source = None
+        self.payload_offset = 0
+        self.payload_length = 0
+        dict.__setitem__(self.data, 'data', decoded)
+
+    def share_data(self, decoded):
+        """Uses decoded, an identical copy of the cel's data, in place of it.
+
+        Unlike replace_data(), the payload read from the file is kept.
+        """
+        if self.cache is not None:
+            self.cache.entries.pop(self, None)
+        dict.__setitem__(self.data, 'data', decoded)
+
+    def __getstate__(self):
+        # Only the raw or compressed payload is sent, the decompressed data
+        # is extracted again on demand once unpickled.
+        state = slot_values(self)
+        properties = dict.copy(self.data)
+        if self.source is not None:
+            state['source'] = bytes(self.source[self.payload_offset:self.payload_offset + self.payload_length])
+            state['payload_offset'] = 0
+            properties.pop('data', None)
+        elif isinstance(properties.get('data'), memoryview):
+            properties['data'] = bytes(properties['data'])
+        state['data'] = properties
+        return state
+
+    def __setstate__(self, state):
+        properties = state.pop('data')
+        Chunk.__setstate__(self, state)
+        self.data = CelData(self)
+        dict.update(self.data, properties)
+
+    def detach(self):
+        if isinstance(self.source, memoryview):
+            self.source = bytes(self.source[self.payload_offset:self.payload_offset + self.payload_length])
+            self.payload_offset = 0
+        if isinstance(dict.get(self.data, 'data'), memoryview):
+            dict.__setitem__(self.data, 'data', bytes(dict.__getitem__(self.data, 'data')))
 
     def unpack_tiles(self):
-        """Basic helper to conver the raw data to an array containing tile ids for common tile id bit sizes."""
-        # I might move that in a wrapper class to split the raw data loading from parsing.
-        if self.cel_type != 2:
+        """Converts a tilemap's raw data to an array of tile values (tile id and flip bits).
+
+        Returns a NumPy array if NumPy is installed, an array.array otherwise,
+        or None if the cel isn't a tilemap with a supported tile size.
+        """
+        if self.link_source is not None:
+            return self.link_source.unpack_tiles()
+        if self.cel_type != 3 or self.data['bits_per_tile'] not in tile_types:
+            return None
+        dtype, typecode = tile_types[self.data['bits_per_tile']]
+        data = self.get_data()
+        if numpy is not None:
+            return numpy.frombuffer(data, dtype=dtype)
+        tiles = array(typecode)
+        if tiles.itemsize * 8 != self.data['bits_per_tile']:
+            # 'I' isn't 32 bits wide on every platform
+            tiles = array('L')
+        tiles.frombytes(data)
+        if sys.byteorder == 'big':
+            tiles.byteswap()
+        return tiles
+
+    def decode_tiles(self):
+        """Splits a tilemap's tiles into tile ids and flip flags, as TilemapTiles.
+
+        The ids and flags are extracted with the cel's own bitmasks. Returns
+        None if the cel isn't a tilemap with a supported tile size. Requires
+        NumPy.
+        """
+        np = require_numpy()
+        if self.link_source is not None:
+            return self.link_source.decode_tiles()
+        if self.cel_type != 3:
             return None
-        tiles = []
-        # Not really DRY, but it's not really at a good enough version.
-        if self.data['bits_per_tile'] == 32:
-            num_loaded_tiles = len(self.data['data']) // 4
-            return struct.unpack('<' + num_loaded_tiles * 'I', self.data['data'])
-        if self.data['bits_per_tile'] == 16:
-            num_loaded_tiles = len(self.data['data']) // 2
-            return struct.unpack('<' + num_loaded_tiles * 'H', self.data['data'])
-        if self.data['bits_per_tile'] == 8:
-            num_loaded_tiles = len(self.data['data']) // 1
-            return struct.unpack('<' + num_loaded_tiles * 'B', self.data['data'])
-        return None
+        tiles = self.to_numpy()
+        if tiles is None:
+            return None
+        tiles = tiles.astype(np.uint32, copy=False)
+        return TilemapTiles(
+            tiles & self.data['tile_id_bitmask'],
+            (tiles & self.data['flip_x_bitmask']) != 0,
+            (tiles & self.data['flip_y_bitmask']) != 0,
+            (tiles & self.data['flip_diagonal_bitmask']) != 0
+        )
+
+    def to_numpy(self, color_depth=None):
+        """Returns the cel's data as a NumPy array viewing the decompressed data.
+
+        Images are shaped (height, width, 4) for RGBA, (height, width, 2) for
+        grayscale (value, alpha) and (height, width) for indexed data. Tilemaps
+        are shaped (height, width) in tiles. color_depth defaults to the
+        file's. Returns None for unresolved linked cels or unsupported cels.
+        """
+        np = require_numpy()
+        if self.link_source is not None:
+            return self.link_source.to_numpy(color_depth)
+        if self.cel_type == 3:
+            tiles = self.unpack_tiles()
+            if tiles is None:
+                return None
+            return tiles.reshape(self.data['height'], self.data['width'])
+        data = self.get_data()
+        if data is None:
+            return None
+        if color_depth is None:
+            color_depth = self.color_depth
+        channels = color_depth_channels[color_depth]
+        pixels = np.frombuffer(data, dtype=np.uint8)
+        if channels == 1:
+            return pixels.reshape(self.data['height'], self.data['width'])
+        return pixels.reshape(self.data['height'], self.data['width'], channels)
 
 class CelExtraChunk(Chunk):
+    __slots__ = ('flags', 'precise_x_pos', 'precise_y_pos', 'cel_width', 'cel_height')
     chunk_id = 0x2006
     celextra_format = '<LLLLL16x'
+    celextra_struct = Struct(celextra_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        cel_struct = Struct(CelExtraChunk.celextra_format)
+        cel_struct = CelExtraChunk.celextra_struct
         (
             self.flags,
             self.precise_x_pos,
@@ -225,16 +626,19 @@ class CelExtraChunk(Chunk):
 
 
 class ColorProfileChunk(Chunk):
+    __slots__ = ('use_color_profile', 'use_fixed_gamma', 'fixed_gamma', 'icc_profile_data')
     chunk_id = 0x2007
-    color_profile_format = "<HHH8x"
+    color_profile_format = "<HHI8x"
     icc_profile_format = "<I"
+    color_profile_struct = Struct(color_profile_format)
+    icc_profile_struct = Struct(icc_profile_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        color_profile_struct = Struct(ColorProfileChunk.color_profile_format)
+        color_profile_struct = ColorProfileChunk.color_profile_struct
         color_profile_offset = data_offset + 6
 
-        icc_profile_length_struct = Struct(ColorProfileChunk.icc_profile_format)
+        icc_profile_length_struct = ColorProfileChunk.icc_profile_struct
         icc_profile_offset = color_profile_offset + color_profile_struct.size
         icc_data_offset = icc_profile_offset + icc_profile_length_struct.size
         (
@@ -244,23 +648,56 @@ class ColorProfileChunk(Chunk):
         ) = color_profile_struct.unpack_from(data, color_profile_offset)
 
         # Read ICC data
-        if self.color_profile_format == 2:
-            icc_data_length = icc_profile_length_struct.unpack_from(data, icc_profile_offset)
+        if self.use_color_profile == 2:
+            (icc_data_length,) = icc_profile_length_struct.unpack_from(data, icc_profile_offset)
             self.icc_profile_data = data[icc_data_offset:icc_data_offset + icc_data_length]
         else:
             self.icc_profile_data = []
 
+    def detach(self):
+        if isinstance(self.icc_profile_data, memoryview):
+            self.icc_profile_data = bytes(self.icc_profile_data)
+
+
+class ExternalFilesChunk(Chunk):
+    __slots__ = ('entries',)
+    chunk_id = 0x2008
+    external_files_format = '<I8x'
+    external_file_format = (
+        '<I' # Entry ID
+        + 'B' # Type (0: palette, 1: tileset, 2: properties extension, 3: tile management extension)
+        + '7x' # Reserved
+    )
+    external_files_struct = Struct(external_files_format)
+    external_file_struct = Struct(external_file_format)
+
+    def __init__(self, data, data_offset=0):
+        Chunk.__init__(self, data, data_offset)
+        (num_entries,) = ExternalFilesChunk.external_files_struct.unpack_from(data, data_offset + 6)
+        entry_offset = data_offset + 6 + ExternalFilesChunk.external_files_struct.size
+
+        self.entries = []
+        for index in range(num_entries):
+            (
+                entry_id,
+                entry_type
+            ) = ExternalFilesChunk.external_file_struct.unpack_from(data, entry_offset)
+            entry_offset += ExternalFilesChunk.external_file_struct.size
+            string_size, name = parse_string(data, entry_offset)
+            entry_offset += string_size
+            self.entries.append(ExternalFile(entry_id, entry_type, name))
 
-# TODO External File Chunk (0x2008)
 
 class MaskChunk(Chunk):
     """According to the specs, this chunk is deprecated."""
+    __slots__ = ('x_pos', 'y_pos', 'width', 'height', 'name', 'bitmap')
     chunk_id = 0x2016
     mask_format = '<hhHH8x'
+    mask_struct = Struct(mask_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        mask_struct = Struct(MaskChunk.mask_format)
+        mask_struct = MaskChunk.mask_struct
         (
             self.x_pos,
             self.y_pos,
@@ -272,84 +709,116 @@ class MaskChunk(Chunk):
         string_size, self.name = parse_string(data, name_offset)
 
         start_range = name_offset + string_size
-        end_range = start_range + math.ceil(self.height*((self.width+7)/8))
-        self.bitmap = data[start_range:start_range:end_range]
+        end_range = start_range + self.height * ((self.width + 7) // 8)
+        self.bitmap = data[start_range:end_range]
+
+    def detach(self):
+        if isinstance(self.bitmap, memoryview):
+            self.bitmap = bytes(self.bitmap)
 
 class PathChunk(Chunk):
     """According to the specs, this chunk is never used."""
+    __slots__ = ()
     chunk_id = 0x2017
-    pass
 
 # TODO Update the chunk format, it's currently missing data.
 class FrameTagsChunk(Chunk):
+    __slots__ = ('tags',)
     chunk_id = 0x2018
     frametag_head_format = '<H8x'
     frametag_format = '<HHB8x3Bx'
+    frametag_head_struct = Struct(frametag_head_format)
+    frametag_struct = Struct(frametag_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        palette_struct = Struct(FrameTagsChunk.frametag_head_format)
+        palette_struct = FrameTagsChunk.frametag_head_struct
         (num_tags,) = palette_struct.unpack_from(data, data_offset + 6)
 
 
         self.tags = []
         tag_offset = data_offset + palette_struct.size + 6
 
-        palette_tag_struct = Struct(FrameTagsChunk.frametag_format)
+        palette_tag_struct = FrameTagsChunk.frametag_struct
         for index in range(num_tags):
-            tag = {'color':{}}
             (
-                tag['from'],
-                tag['to'],
-                tag['loop'],
-                tag['color']['red'],
-                tag['color']['green'],
-                tag['color']['blue']
+                from_frame,
+                to_frame,
+                loop,
+                red,
+                green,
+                blue
             ) = palette_tag_struct.unpack_from(data, tag_offset)
-            self.tags.append(tag)
             tag_offset += palette_tag_struct.size
-            string_size, tag['name'] = parse_string(data, tag_offset)
+            string_size, name = parse_string(data, tag_offset)
             tag_offset += string_size
+            self.tags.append(FrameTag(from_frame, to_frame, loop, RGBColor(red, green, blue), name))
 
 class PaletteChunk(Chunk):
+    """The colors are stored packed, as 4 RGBA bytes per color in rgba."""
+    __slots__ = ('palette_size', 'first_color_index', 'last_color_index', 'rgba', 'names')
     chunk_id = 0x2019
     palette_format = '<III8x'
+    palette_color_format = '<HBBBB'
+    palette_struct = Struct(palette_format)
+    palette_color_struct = Struct(palette_color_format)
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
-        palette_struct = Struct(PaletteChunk.palette_format)
+        palette_struct = PaletteChunk.palette_struct
         (
             self.palette_size,
             self.first_color_index,
             self.last_color_index
         ) = palette_struct.unpack_from(data, data_offset + 6)
-        color_struct = Struct('<HBBBB')
-        self.colors = []
+        color_struct = PaletteChunk.palette_color_struct
+        num_colors = max(0, self.last_color_index - self.first_color_index + 1)
+        self.rgba = bytearray(num_colors * 4)
+        # Color index -> name, only for named colors
+        self.names = {}
 
         color_offset = data_offset + 6 + palette_struct.size
-        for index in range(self.first_color_index, self.last_color_index+1):
-            color = {'name':None}
+        colors_data = bytes(data[color_offset:color_offset + num_colors * color_struct.size])
+        if not any(colors_data[0::color_struct.size]) and not any(colors_data[1::color_struct.size]):
+            # No color has a name, the colors are evenly spaced: copy each channel at once.
+            for channel in range(4):
+                self.rgba[channel::4] = colors_data[2 + channel::color_struct.size]
+            return
+
+        for index in range(num_colors):
             (
-                color['flags'],
-                color['red'],
-                color['green'],
-                color['blue'],
-                color['alpha']
+                flags,
+                red,
+                green,
+                blue,
+                alpha
             ) = color_struct.unpack_from(data, color_offset)
             color_offset += color_struct.size
-            if color['flags'] & 1 != 0:
-                string_size, color['name'] = parse_string(data, color_offset)
+            self.rgba[index * 4:index * 4 + 4] = bytes((red, green, blue, alpha))
+            if flags & 1 != 0:
+                string_size, self.names[self.first_color_index + index] = parse_string(data, color_offset)
                 color_offset += string_size
 
-            self.colors.append(color)
+    @property
+    def colors(self):
+        """The palette's colors as PaletteColor records, built on access."""
+        colors = []
+        for index in range(len(self.rgba) // 4):
+            name = self.names.get(self.first_color_index + index)
+            colors.append(PaletteColor(1 if name is not None else 0, *self.rgba[index * 4:index * 4 + 4], name))
+        return colors
 
 # TODO Update this chunk, it's missing properties and the property map.
 class UserDataChunk(Chunk):
+    __slots__ = ('flags', 'string', 'red', 'green', 'blue', 'alpha')
     chunk_id = 0x2020
+    userdata_color_format = '<BBBB'
+    userdata_color_struct = Struct(userdata_color_format)
+
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
         userdata_offset = data_offset + 6
-        (self.flags,) = Struct('<I').unpack_from(data, userdata_offset)
+        (self.flags,) = uint32_struct.unpack_from(data, userdata_offset)
         userdata_offset += 4
         if self.flags & 1 != 0:
             string_size, self.string = parse_string(data, userdata_offset)
@@ -360,24 +829,29 @@ class UserDataChunk(Chunk):
                 self.green,
                 self.blue,
                 self.alpha
-            ) = Struct('<BBBB').unpack_from(data, userdata_offset)
+            ) = UserDataChunk.userdata_color_struct.unpack_from(data, userdata_offset)
         if self.flags & 4 != 0:
-            print("Property map not yet supported, skipped.")
+            logger.info('User data property maps are not supported yet, skipped')
 
 class SliceChunk(Chunk):
+    __slots__ = ('flags', 'reserved', 'name', 'slices')
     chunk_id = 0x2022
     slice_chunk_format = '<III'
     slice_format = '<IiiII'
     slice_key_format = '<IiiII'
     slice_center_format = '<iiII'
     slice_pivot_format = '<ii'
+    slice_chunk_struct = Struct(slice_chunk_format)
+    slice_struct = Struct(slice_format)
+    slice_center_struct = Struct(slice_center_format)
+    slice_pivot_struct = Struct(slice_pivot_format)
 
 
     def __init__(self, data, data_offset=0):
         Chunk.__init__(self, data, data_offset)
         slice_offset  = data_offset + 6
 
-        slice_chunk_struct = Struct(SliceChunk.slice_chunk_format)
+        slice_chunk_struct = SliceChunk.slice_chunk_struct
         num_slices, self.flags, self.reserved = slice_chunk_struct.unpack_from(data, slice_offset)
         slice_offset += slice_chunk_struct.size
 
@@ -386,39 +860,43 @@ class SliceChunk(Chunk):
 
         self.slices = []
 
+        slice_struct = SliceChunk.slice_struct
+        slice_center_struct = SliceChunk.slice_center_struct
+        slice_pivot_struct = SliceChunk.slice_pivot_struct
         for i in range(num_slices):
-            slice_struct = Struct(SliceChunk.slice_format)
-            slice = {}
             (
-                slice['start_frame'],
-                slice['x'],
-                slice['y'],
-                slice['width'],
-                slice['height']
+                start_frame,
+                x,
+                y,
+                width,
+                height
             ) = slice_struct.unpack_from(data, slice_offset)
             slice_offset += slice_struct.size
+            center = None
+            pivot = None
             if self.flags & 1 != 0:
-                slice_center_struct = Struct(SliceChunk.slice_center_format)
-                slice['center'] = {}
-                (
-                    slice['center']['x'],
-                    slice['center']['y'],
-                    slice['center']['width'],
-                    slice['center']['height']
-                ) = slice_center_struct.unpack_from(data, slice_offset)
+                center = SliceCenter(*slice_center_struct.unpack_from(data, slice_offset))
                 slice_offset += slice_center_struct.size
             if self.flags & 2 != 0:
-                slice_pivot_struct = Struct(SliceChunk.slice_pivot_format)
-                slice['pivot'] = {}
-                (
-                    slice['pivot']['x'],
-                    slice['pivot']['y'],
-                ) = slice_pivot_struct.unpack_from(data, slice_offset)
+                pivot = SlicePivot(*slice_pivot_struct.unpack_from(data, slice_offset))
                 slice_offset += slice_pivot_struct.size
-            self.slices.append(slice)
+            self.slices.append(SliceKey(start_frame, x, y, width, height, center, pivot))
 
 
 class TilesetChunk(Chunk):
+    __slots__ = (
+        'tileset_id',
+        'tileset_flags',
+        'num_tiles',
+        'tile_width',
+        'tile_height',
+        'base_index',
+        'layer_name',
+        'external_file_id',
+        'external_tileset_id',
+        'compressed_data',
+        'decompressed_data'
+    )
     chunk_id = 0x2023
     tileset_chunk_format = (
         '<I' # Tileset ID
@@ -436,17 +914,22 @@ class TilesetChunk(Chunk):
     tileset_chunk_compressed_tiles_format = (
         '<I' # Data length
     )
+    tileset_chunk_struct = Struct(tileset_chunk_format)
+    tileset_chunk_external_id_struct = Struct(tileset_chunk_external_id_format)
+    tileset_chunk_compressed_tiles_struct = Struct(tileset_chunk_compressed_tiles_format)
 
-    def __init__(self, data, data_offset=0):
+    def __init__(self, data, data_offset=0, lazy=False):
+        """If lazy is set, the tileset image is only decompressed on first access."""
+        Chunk.__init__(self, data, data_offset)
         slice_offset = data_offset + 6
-        tileset_chunk_struct = Struct(TilesetChunk.tileset_chunk_format)
+        tileset_chunk_struct = TilesetChunk.tileset_chunk_struct
         tileset_name_offset = slice_offset + tileset_chunk_struct.size
-        tileset_external_id_struct = Struct(TilesetChunk.tileset_chunk_external_id_format)
-        tileset_compressed_data_struct = Struct(TilesetChunk.tileset_chunk_compressed_tiles_format)
+        tileset_external_id_struct = TilesetChunk.tileset_chunk_external_id_struct
+        tileset_compressed_data_struct = TilesetChunk.tileset_chunk_compressed_tiles_struct
         (
             self.tileset_id,
             self.tileset_flags,
-            num_tiles,
+            self.num_tiles,
             self.tile_width,
             self.tile_height,
             self.base_index
@@ -466,5 +949,54 @@ class TilesetChunk(Chunk):
             (compressed_data_length,) = tileset_compressed_data_struct.unpack_from(data, additional_data_offset)
             compressed_data_start = additional_data_offset + tileset_compressed_data_struct.size
             compressed_data_end = compressed_data_start + compressed_data_length
-            compressed_data = data[compressed_data_start:compressed_data_end]
-            self.tileset_image = zlib.decompress(compressed_data)
\ No newline at end of file
+            self.compressed_data = data[compressed_data_start:compressed_data_end]
+        else:
+            self.compressed_data = None
+        self.decompressed_data = None
+
+        if not lazy and self.compressed_data is not None:
+            self.set_data(zlib.decompress(self.compressed_data))
+
+    @property
+    def tileset_image(self):
+        """The tiles' pixels, stacked vertically, or None if the tileset has no image."""
+        if self.decompressed_data is None and self.compressed_data is not None:
+            self.set_data(zlib.decompress(self.compressed_data))
+        return self.decompressed_data
+
+    def tiles(self, color_depth):
+        """Returns the tileset image as a NumPy array of tiles viewing the decompressed data.
+
+        The array is shaped (num_tiles, tile_height, tile_width) for indexed
+        images and (num_tiles, tile_height, tile_width, channels) otherwise,
+        like CelChunk.to_numpy(). Returns None if the tileset has no image.
+        """
+        np = require_numpy()
+        image = self.tileset_image
+        if image is None:
+            return None
+        channels = color_depth_channels[color_depth]
+        shape = (self.num_tiles, self.tile_height, self.tile_width)
+        if channels != 1:
+            shape += (channels,)
+        return np.frombuffer(image, dtype=np.uint8).reshape(shape)
+
+    def has_pending_data(self):
+        return self.compressed_data is not None and self.decompressed_data is None
+
+    def payload(self):
+        return self.compressed_data
+
+    def set_data(self, decoded):
+        self.decompressed_data = decoded
+
+    def replace_data(self, decoded):
+        """Replaces the tileset image, which writers then compress instead of copying the file's."""
+        self.compressed_data = None
+        self.decompressed_data = decoded
+
+    def detach(self):
+        if isinstance(self.compressed_data, memoryview):
+            self.compressed_data = bytes(self.compressed_data)
+        if isinstance(self.decompressed_data, memoryview):
+            self.decompressed_data = bytes(self.decompressed_data)
\ No newline at end of file
@@ -0,0 +1,220 @@
+from typing import Any, NamedTuple
+
+from .chunks import require_numpy
+from .palette import indexed_lut
+from .render import LAYER_BACKGROUND, frame_cels, layers_by_index, tileset_tiles, tilemap_pixels
+
+
+class PixelFormat(NamedTuple):
+    bytes_per_pixel: int
+    # RGBA channel of each output byte, None for packed formats
+    order: Any
+    premultiplied: bool
+    # NumPy dtype of packed pixels, byte order included
+    packed_type: Any
+
+
+pixel_formats = {
+    'rgba': PixelFormat(4, (0, 1, 2, 3), False, None),
+    'bgra': PixelFormat(4, (2, 1, 0, 3), False, None),
+    'argb': PixelFormat(4, (3, 0, 1, 2), False, None),
+    'rgba_premultiplied': PixelFormat(4, (0, 1, 2, 3), True, None),
+    'bgra_premultiplied': PixelFormat(4, (2, 1, 0, 3), True, None),
+    'argb_premultiplied': PixelFormat(4, (3, 0, 1, 2), True, None),
+    # 5 bits of red, 6 of green, 5 of blue, alpha dropped
+    'rgb565': PixelFormat(2, None, False, '<u2'),
+    'rgb565_be': PixelFormat(2, None, False, '>u2')
+}
+
+
+class ConvertedCel(NamedTuple):
+    """Location of a converted cel in the output buffer of convert_frame()."""
+    layer_index: int
+    # Position of the cel in the canvas
+    x: int
+    y: int
+    width: int
+    height: int
+    # Where its rows start in the buffer, and the bytes between two rows
+    offset: int
+    stride: int
+
+
+def output_array(out, pixel_format, width, height, stride=None, offset=0):
+    """Returns a NumPy array writing to the pixels of a buffer.
+
+    out is any writable object supporting the buffer protocol, or None to
+    allocate a bytearray. Rows are stride bytes apart (packed if None),
+    starting at offset. The array is shaped (height, width, 4), or
+    (height, width) for packed formats.
+    """
+    np = require_numpy()
+    bytes_per_pixel = pixel_format.bytes_per_pixel
+    row_size = width * bytes_per_pixel
+    if stride is None:
+        stride = row_size
+    elif stride < row_size:
+        raise ValueError('Stride of {} bytes shorter than a row of {} bytes'.format(stride, row_size))
+    size = offset + stride * (height - 1) + row_size if height else offset
+    if out is None:
+        out = bytearray(size)
+    elif memoryview(out).nbytes < size:
+        raise ValueError('Buffer of {} bytes too small, {} bytes are needed'.format(memoryview(out).nbytes, size))
+    if pixel_format.packed_type is not None:
+        array = np.ndarray((height, width), pixel_format.packed_type, out, offset, (stride, bytes_per_pixel))
+    else:
+        array = np.ndarray((height, width, 4), np.uint8, out, offset, (stride, 4, 1))
+    if not array.flags.writeable:
+        raise ValueError('The output buffer is read-only')
+    return array
+
+
+def convert_channels(red, green, blue, alpha, pixel_format, target):
+    """Writes RGBA channels (uint8 arrays, possibly the same) to target in a pixel format."""
+    np = require_numpy()
+    channels = [red, green, blue, alpha]
+    if pixel_format.premultiplied:
+        alpha16 = alpha.astype(np.uint16)
+        # Grayscale channels are the same array, premultiply it once
+        premultiplied = {}
+        for index in range(3):
+            channel = premultiplied.get(id(channels[index]))
+            if channel is None:
+                channel = channels[index] * alpha16
+                channel += 127
+                channel //= 255
+                premultiplied[id(channels[index])] = channel
+            channels[index] = channel
+    if pixel_format.packed_type is not None:
+        packed = (channels[0] >> 3).astype(np.uint16) << 11
+        packed |= (channels[1] >> 2).astype(np.uint16) << 5
+        packed |= channels[2] >> 3
+        target[...] = packed
+    else:
+        for index, channel in enumerate(pixel_format.order):
+            target[..., index] = channels[channel]
+
+
+def convert_lut(lut, pixel_format):
+    """Converts a (256, 4) RGBA palette lookup table to a pixel format."""
+    np = require_numpy()
+    if pixel_format.packed_type is not None:
+        converted = np.empty((1, len(lut)), dtype=pixel_format.packed_type)
+    else:
+        converted = np.empty((1, len(lut), 4), dtype=np.uint8)
+    lut = lut[None]
+    convert_channels(lut[..., 0], lut[..., 1], lut[..., 2], lut[..., 3], pixel_format, converted)
+    return converted[0]
+
+
+def convert_pixels(pixels, color_depth, pixel_format, out=None, stride=None, offset=0, lut=None):
+    """Converts pixels shaped like CelChunk.to_numpy()'s to a pixel format in one pass.
+
+    pixel_format is one of pixel_formats' names. The pixels are written to
+    out, a writable buffer (rows stride bytes apart, from offset), or to a
+    new bytearray. Indexed pixels need lut, a (256, 4) RGBA lookup table as
+    returned by palette.indexed_lut(): it's converted instead of the
+    pixels, which are then only looked up. Returns the array viewing the
+    written pixels, see output_array().
+    """
+    np = require_numpy()
+    pixel_format = pixel_formats[pixel_format]
+    (height, width) = pixels.shape[:2]
+    target = output_array(out, pixel_format, width, height, stride, offset)
+    if color_depth == 32:
+        convert_channels(pixels[..., 0], pixels[..., 1], pixels[..., 2], pixels[..., 3], pixel_format, target)
+    elif color_depth == 16:
+        value = pixels[..., 0]
+        convert_channels(value, value, value, pixels[..., 1], pixel_format, target)
+    elif color_depth == 8:
+        if lut is None:
+            raise ValueError('Converting indexed pixels needs a palette lookup table')
+        np.take(convert_lut(lut, pixel_format), pixels, axis=0, out=target, mode='clip')
+    else:
+        raise ValueError('Unsupported color depth {}'.format(color_depth))
+    return target
+
+
+class CelConverter(object):
+    """Converts the cels of a file, keeping the tilesets and palette tables it needs between cels."""
+
+    def __init__(self, parsed_file):
+        self.parsed_file = parsed_file
+        self.layers = layers_by_index(parsed_file)
+        self.tilesets = None
+        # Background flag -> lookup table
+        self.luts = {}
+
+    def cel_pixels(self, cel):
+        """Returns a resolved cel's pixels shaped like CelChunk.to_numpy()'s, or None if it has none."""
+        if cel.cel_type == 3:
+            if self.tilesets is None:
+                self.tilesets = tileset_tiles(self.parsed_file)
+            layer = self.layers.get(cel.layer_index)
+            tiles = self.tilesets.get(layer.tileset_index) if layer is not None else None
+            if tiles is None:
+                return None
+            return tilemap_pixels(cel, tiles)
+        if cel.cel_type in (0, 2):
+            return cel.to_numpy(self.parsed_file.header.color_depth)
+        return None
+
+    def lut(self, layer_index):
+        if self.parsed_file.header.color_depth != 8:
+            return None
+        layer = self.layers.get(layer_index)
+        background = layer is not None and bool(layer.flags & LAYER_BACKGROUND)
+        lut = self.luts.get(background)
+        if lut is None:
+            lut = self.luts[background] = indexed_lut(self.parsed_file, not background)
+        return lut
+
+    def convert(self, cel, pixel_format, out=None, stride=None, offset=0, pixels=None):
+        """Converts a cel's pixels, see convert_pixels(). Returns None if the cel has no pixels."""
+        if cel.link_source is not None:
+            cel = cel.link_source
+        if pixels is None:
+            pixels = self.cel_pixels(cel)
+            if pixels is None:
+                return None
+        return convert_pixels(pixels, self.parsed_file.header.color_depth, pixel_format, out, stride, offset,
+                              self.lut(cel.layer_index))
+
+
+def convert_cel(parsed_file, cel, pixel_format, out=None, stride=None, offset=0):
+    """Converts a cel's pixels to a pixel format, see convert_pixels() and CelConverter."""
+    return CelConverter(parsed_file).convert(cel, pixel_format, out, stride, offset)
+
+
+def convert_frame(parsed_file, frame_index, pixel_format, out=None, row_alignment=1, converter=None):
+    """Converts all the cels of a frame into one buffer, one after the other.
+
+    Each cel's rows are padded to a multiple of row_alignment bytes. out is
+    a writable buffer large enough for them all, or None to allocate a
+    bytearray. Returns the buffer and the ConvertedCel of each cel, bottom
+    layer first. A CelConverter can be shared across frames.
+    """
+    if converter is None:
+        converter = CelConverter(parsed_file)
+    bytes_per_pixel = pixel_formats[pixel_format].bytes_per_pixel
+    cels = []
+    size = 0
+    for layer_index, cel in sorted(frame_cels(parsed_file, frame_index).items()):
+        # Linked cels whose source is missing are None
+        if cel is None:
+            continue
+        pixels = converter.cel_pixels(cel)
+        if pixels is None:
+            continue
+        (height, width) = pixels.shape[:2]
+        stride = -(-width * bytes_per_pixel // row_alignment) * row_alignment
+        cels.append((cel, pixels, ConvertedCel(layer_index, cel.x_pos, cel.y_pos, width, height, size, stride)))
+        size += stride * height
+
+    if out is None:
+        out = bytearray(size)
+    elif memoryview(out).nbytes < size:
+        raise ValueError('Buffer of {} bytes too small, {} bytes are needed'.format(memoryview(out).nbytes, size))
+    for cel, pixels, converted in cels:
+        converter.convert(cel, pixel_format, out, converted.stride, converted.offset, pixels)
+    return (out, [converted for _, _, converted in cels])
@@ -0,0 +1,152 @@
+import hashlib
+
+from .chunks import CelChunk, TilesetChunk, color_depth_channels
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class DedupIndex(object):
+    """Identical cel images, tilemaps, tilesets and tiles across a set of parsed files.
+
+    Buffers are identified by their kind, size and a hash of their decoded
+    data. Identical ones are replaced by the first one met (copied if it
+    views a file's mapping), so that the files share it in memory; the
+    payloads read from the files are kept, writers still copy them.
+    Compressed payloads are hashed first: a payload already met gives its
+    buffer away without being decompressed.
+
+    cels maps (file name, layer index, frame index) to the index of the
+    cel's buffer in buffers, linked cels included, and tilesets maps (file
+    name, tileset id) the same way. tiles maps (file name, tileset id, tile
+    index) to the index of the tile's pixels in tile_buffers, which view the
+    shared tileset buffers.
+    """
+
+    def __init__(self):
+        self.buffers = []
+        self.tile_buffers = []
+        self.cels = {}
+        self.tilesets = {}
+        self.tiles = {}
+        # (kind, size..., hash) -> buffer index, for decoded and compressed data
+        self.keys = {}
+        self.compressed_keys = {}
+        # (color depth, tile width, tile height, hash) -> tile index
+        self.tile_keys = {}
+        # Buffer index of a tileset -> tile indices of its tiles
+        self.tileset_tiles = {}
+        # Buffers found through their compressed payload, and through their decoded data
+        self.compressed_hits = 0
+        self.decoded_hits = 0
+        # Size of the duplicate buffers no longer held
+        self.shared_bytes = 0
+
+    @property
+    def unique_bytes(self):
+        return sum(len(buffer) for buffer in self.buffers)
+
+    def add_buffer(self, shape, payload, get_data, share_data):
+        """Returns the index of a buffer, sharing an identical one if there's any.
+
+        shape identifies the buffer's kind and size, payload is its
+        compressed data or None. get_data() returns the decoded data, which
+        share_data(buffer) replaces.
+        """
+        if payload is not None:
+            compressed_key = shape + (digest(payload),)
+            index = self.compressed_keys.get(compressed_key)
+            if index is not None:
+                self.compressed_hits += 1
+                self.shared_bytes += len(self.buffers[index])
+                share_data(self.buffers[index])
+                return index
+
+        data = get_data()
+        key = shape + (digest(data),)
+        index = self.keys.get(key)
+        if index is None:
+            index = self.keys[key] = len(self.buffers)
+            if isinstance(data, memoryview):
+                # Raw cels of mapped files view the mapping, which couldn't
+                # be closed once shared with other files.
+                data = bytes(data)
+            self.buffers.append(data)
+        else:
+            self.decoded_hits += 1
+            self.shared_bytes += len(data)
+        # The first cel sharing a buffer holds it as well, out of a cel cache.
+        share_data(self.buffers[index])
+        if payload is not None:
+            self.compressed_keys[compressed_key] = index
+        return index
+
+    def add_cel(self, name, frame_index, cel, depth):
+        if cel.cel_type in (0, 2):
+            shape = ('cel', depth, cel.data['width'], cel.data['height'])
+        elif cel.cel_type == 3:
+            shape = ('tilemap', cel.data['bits_per_tile'], cel.data['width'], cel.data['height'])
+        else:
+            return
+        if cel.source is None and cel.get_data() is None:
+            return
+        payload = cel.payload() if cel.source is not None and cel.compressed else None
+        self.cels[(name, cel.layer_index, frame_index)] = self.add_buffer(shape, payload, cel.get_data, cel.share_data)
+
+    def add_tileset(self, name, tileset, depth):
+        if tileset.compressed_data is None and tileset.decompressed_data is None:
+            return
+        shape = ('tileset', depth, tileset.tile_width, tileset.tile_height, tileset.num_tiles)
+        index = self.add_buffer(shape, tileset.compressed_data, lambda: tileset.tileset_image, tileset.set_data)
+        self.tilesets[(name, tileset.tileset_id)] = index
+
+        tile_indices = self.tileset_tiles.get(index)
+        if tile_indices is None:
+            tile_indices = self.tileset_tiles[index] = []
+            image = memoryview(self.buffers[index]).cast('B')
+            tile_size = tileset.tile_width * tileset.tile_height * color_depth_channels[depth]
+            for tile in range(tileset.num_tiles):
+                tile_data = image[tile * tile_size:(tile + 1) * tile_size]
+                key = (depth, tileset.tile_width, tileset.tile_height, digest(tile_data))
+                tile_index = self.tile_keys.get(key)
+                if tile_index is None:
+                    tile_index = self.tile_keys[key] = len(self.tile_buffers)
+                    self.tile_buffers.append(tile_data)
+                tile_indices.append(tile_index)
+        for tile, tile_index in enumerate(tile_indices):
+            self.tiles[(name, tileset.tileset_id, tile)] = tile_index
+
+    def add_file(self, name, parsed_file):
+        """Deduplicates the cels and tilesets of a parsed file against the files added before."""
+        depth = parsed_file.header.color_depth
+        for frame_index in range(len(parsed_file.frames)):
+            for chunk in parsed_file.frame(frame_index).chunks:
+                if isinstance(chunk, TilesetChunk):
+                    self.add_tileset(name, chunk, depth)
+                elif not isinstance(chunk, CelChunk):
+                    continue
+                elif chunk.cel_type == 1:
+                    index = self.cels.get((name, chunk.layer_index, chunk.data['link']))
+                    if index is not None:
+                        self.cels[(name, chunk.layer_index, frame_index)] = index
+                else:
+                    self.add_cel(name, frame_index, chunk, depth)
+
+    def groups(self, mapping):
+        """Inverts cels, tilesets or tiles: returns the lists of keys sharing a buffer, for those shared by several."""
+        groups = {}
+        for key, index in mapping.items():
+            groups.setdefault(index, []).append(key)
+        return [keys for keys in groups.values() if len(keys) > 1]
+
+
+def deduplicate(files):
+    """Shares the identical cels and tilesets of parsed files, returning their DedupIndex.
+
+    files maps names to AsepriteFile instances.
+    """
+    index = DedupIndex()
+    for name, parsed_file in files.items():
+        index.add_file(name, parsed_file)
+    return index
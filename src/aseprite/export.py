@@ -0,0 +1,350 @@
+import struct
+import zlib
+from struct import Struct
+
+from .chunks import FrameTagsChunk, require_numpy
+from .render import IncrementalRenderer, union_rect
+
+png_signature = b'\x89PNG\r\n\x1a\n'
+png_chunk_head_struct = Struct('>I4s')
+png_ihdr_struct = Struct(
+    '>I' # Width
+    + 'I' # Height
+    + 'B' # Bit depth
+    + 'B' # Color type (6: RGBA)
+    + 'B' # Compression method
+    + 'B' # Filter method
+    + 'B' # Interlace method
+)
+apng_actl_struct = Struct(
+    '>I' # Number of frames
+    + 'I' # Number of plays (0: infinite)
+)
+apng_fctl_struct = Struct(
+    '>I' # Sequence number
+    + 'I' # Width
+    + 'I' # Height
+    + 'I' # X offset
+    + 'I' # Y offset
+    + 'H' # Delay numerator
+    + 'H' # Delay denominator
+    + 'B' # Dispose operation
+    + 'B' # Blend operation
+)
+uint32_be_struct = Struct('>I')
+# APNG delays are stored on 16 bits, in milliseconds here
+max_apng_delay = 0xFFFF
+max_gif_delay = 0xFFFF
+
+# GIF disposal methods
+GIF_DISPOSE_NONE = 1
+GIF_DISPOSE_BACKGROUND = 2
+
+
+def tag_frames(parsed_file, tag_name):
+    """Returns the frame indices of a tag's loop, in the order its direction plays them.
+
+    Ping-pong tags don't repeat their ends, so looping over the indices plays
+    them like Aseprite does.
+    """
+    for frame in parsed_file.frames:
+        for chunk in frame.chunks:
+            if isinstance(chunk, FrameTagsChunk):
+                for tag in chunk.tags:
+                    if tag.name == tag_name:
+                        forward = list(range(tag.from_frame, tag.to_frame + 1))
+                        if tag.loop == 1:
+                            return forward[::-1]
+                        if tag.loop == 2:
+                            return forward + forward[-2:0:-1]
+                        if tag.loop == 3:
+                            return forward[::-1] + forward[1:-1]
+                        return forward
+    raise KeyError("No tag named '{}'".format(tag_name))
+
+
+def export_frames(parsed_file, frame_indices):
+    """Returns the list of frame indices to export, all the frames if None, raising ValueError if it's empty."""
+    if frame_indices is None:
+        frame_indices = range(parsed_file.header.num_frames)
+    frame_indices = list(frame_indices)
+    if not frame_indices:
+        raise ValueError('No frames to export')
+    return frame_indices
+
+
+def frame_updates(parsed_file, frame_indices):
+    """Composites frames one after another, yielding what changed from a frame to the next.
+
+    Yields (canvas, previous, rect, duration): canvas is the composited
+    frame, previous the region of the previous frame it replaces and rect the
+    (x, y, width, height) region that changed, or None if nothing did. The
+    first frame is the whole canvas. canvas is updated in place. Only the
+    regions where cels changed are rendered again (see IncrementalRenderer),
+    and they're narrowed down to the pixels that actually changed.
+    """
+    np = require_numpy()
+    renderer = IncrementalRenderer(parsed_file)
+    for frame_index in frame_indices:
+        duration = parsed_file.frame(frame_index).frame_duration
+        if renderer.canvas is None:
+            (canvas, rects) = renderer.render(frame_index)
+            yield (canvas, np.zeros_like(canvas), rects[0], duration)
+            continue
+
+        rects = renderer.changed_rects(frame_index)
+        region = None
+        for rect in rects:
+            region = union_rect(region, rect)
+        if region is None:
+            renderer.render(frame_index, rects)
+            yield (renderer.canvas, None, None, duration)
+            continue
+        (x, y, width, height) = region
+        before = renderer.canvas[y:y + height, x:x + width].copy()
+        (canvas, _) = renderer.render(frame_index, rects)
+        after = canvas[y:y + height, x:x + width]
+        changed = (before != after).any(axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            yield (canvas, None, None, duration)
+            continue
+        columns = np.flatnonzero(changed.any(axis=0))
+        top, bottom = int(rows[0]), int(rows[-1]) + 1
+        left, right = int(columns[0]), int(columns[-1]) + 1
+        yield (canvas, before[top:bottom, left:right], (x + left, y + top, right - left, bottom - top), duration)
+
+
+def png_chunk(chunk_type, data):
+    return png_chunk_head_struct.pack(len(data), chunk_type) + data + uint32_be_struct.pack(zlib.crc32(data, zlib.crc32(chunk_type)))
+
+
+def png_image_data(pixels, compress_level=6):
+    """Returns the zlib stream of (height, width, 4) RGBA pixels, unfiltered."""
+    np = require_numpy()
+    (height, width) = pixels.shape[:2]
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 4)
+    return zlib.compress(rows.data, compress_level)
+
+
+def png_bytes(pixels, compress_level=6):
+    """Encodes (height, width, 4) uint8 RGBA pixels as a PNG file."""
+    (height, width) = pixels.shape[:2]
+    return b''.join((
+        png_signature,
+        png_chunk(b'IHDR', png_ihdr_struct.pack(width, height, 8, 6, 0, 0, 0)),
+        png_chunk(b'IDAT', png_image_data(pixels, compress_level)),
+        png_chunk(b'IEND', b'')
+    ))
+
+
+def write_png_sequence(parsed_file, path_pattern, frame_indices=None, compress_level=6):
+    """Writes frames as PNG files named after path_pattern formatted with the frame index.
+
+    A frame identical to the previous one isn't encoded again, the previous
+    file's bytes are written instead. Returns the written paths.
+    """
+    if frame_indices is None:
+        frame_indices = range(parsed_file.header.num_frames)
+    frame_indices = list(frame_indices)
+    paths = []
+    encoded = None
+    for frame_index, (canvas, _, rect, _) in zip(frame_indices, frame_updates(parsed_file, frame_indices)):
+        if rect is not None:
+            encoded = png_bytes(canvas, compress_level)
+        path = path_pattern.format(frame_index)
+        with open(path, 'wb') as f:
+            f.write(encoded)
+        paths.append(path)
+    return paths
+
+
+def apng_bytes(parsed_file, frame_indices=None, plays=0, compress_level=6):
+    """Encodes frames as an animated PNG.
+
+    Frames after the first only store the region that changed, replacing the
+    previous frame's pixels there. Frames identical to the previous one
+    extend its delay instead of being stored. plays is the number of times
+    the animation plays, 0 looping forever.
+    """
+    frame_indices = export_frames(parsed_file, frame_indices)
+    # [rect, delay, zlib stream]
+    frames = []
+    for (canvas, _, rect, duration) in frame_updates(parsed_file, frame_indices):
+        if rect is None and frames[-1][1] + duration <= max_apng_delay:
+            frames[-1][1] += duration
+            continue
+        if rect is None:
+            # Too long a delay, the unchanged pixel in the corner goes in a frame of its own.
+            rect = (0, 0, 1, 1)
+        (x, y, width, height) = rect
+        frames.append([rect, min(duration, max_apng_delay), png_image_data(canvas[y:y + height, x:x + width], compress_level)])
+
+    (height, width) = canvas.shape[:2]
+    parts = [
+        png_signature,
+        png_chunk(b'IHDR', png_ihdr_struct.pack(width, height, 8, 6, 0, 0, 0)),
+        png_chunk(b'acTL', apng_actl_struct.pack(len(frames), plays))
+    ]
+    sequence = 0
+    for frame_number, ((x, y, width, height), delay, data) in enumerate(frames):
+        # Dispose operation 0 (none), blend operation 0 (source)
+        parts.append(png_chunk(b'fcTL', apng_fctl_struct.pack(sequence, width, height, x, y, delay, 1000, 0, 0)))
+        sequence += 1
+        if frame_number == 0:
+            parts.append(png_chunk(b'IDAT', data))
+        else:
+            parts.append(png_chunk(b'fdAT', uint32_be_struct.pack(sequence) + data))
+            sequence += 1
+    parts.append(png_chunk(b'IEND', b''))
+    return b''.join(parts)
+
+
+def gif_palette(images):
+    """Returns the (colors, mapping) of a GIF palette for RGBA images.
+
+    colors is a (n, 3) uint8 array of at most 255 colors, the index n being
+    left for transparency, and mapping(image) converts an image to indices.
+    Pixels with an alpha under 128 are transparent. If the images hold more
+    than 255 colors, they're reduced to a uniform 6x7x6 color cube.
+    """
+    np = require_numpy()
+    opaque = [image[image[..., 3] >= 128][:, :3] for image in images]
+    keys = np.unique(np.concatenate([rgb_keys(np, colors) for colors in opaque]))
+    if len(keys) <= 255:
+        colors = np.stack(((keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF), axis=1).astype(np.uint8)
+
+        def mapping(image):
+            indices = np.searchsorted(keys, rgb_keys(np, image[..., :3])).astype(np.uint8)
+            indices[image[..., 3] < 128] = len(keys)
+            return indices
+        return colors, mapping
+
+    levels = np.array((6, 7, 6))
+    grid = np.stack(np.meshgrid(*(np.arange(level) for level in levels), indexing='ij'), axis=-1).reshape(-1, 3)
+    colors = np.round(grid * 255 / (levels - 1)).astype(np.uint8)
+
+    def mapping(image):
+        steps = np.round(image[..., :3].astype(np.float32) * (levels - 1) / 255).astype(np.uint8)
+        indices = ((steps[..., 0] * levels[1] + steps[..., 1]) * levels[2] + steps[..., 2]).astype(np.uint8)
+        indices[image[..., 3] < 128] = len(colors)
+        return indices
+    return colors, mapping
+
+
+def rgb_keys(np, rgb):
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def lzw_encode(indices, min_code_size):
+    """Compresses a sequence of color indices with GIF's variable-length LZW."""
+    clear_code = 1 << min_code_size
+    end_code = clear_code + 1
+    output = bytearray()
+    bit_buffer = 0
+    bit_count = 0
+    code_size = min_code_size + 1
+    # (prefix code << 8 | index) -> code
+    codes = {}
+    next_code = end_code + 1
+
+    def emit(code):
+        nonlocal bit_buffer, bit_count
+        bit_buffer |= code << bit_count
+        bit_count += code_size
+        while bit_count >= 8:
+            output.append(bit_buffer & 0xFF)
+            bit_buffer >>= 8
+            bit_count -= 8
+
+    emit(clear_code)
+    iterator = iter(indices)
+    current = next(iterator, None)
+    for index in iterator:
+        key = current << 8 | index
+        code = codes.get(key)
+        if code is not None:
+            current = code
+            continue
+        emit(current)
+        if next_code == 4096:
+            # Table full, start over
+            emit(clear_code)
+            codes = {}
+            next_code = end_code + 1
+            code_size = min_code_size + 1
+        else:
+            codes[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        current = index
+    if current is not None:
+        emit(current)
+    emit(end_code)
+    if bit_count:
+        output.append(bit_buffer & 0xFF)
+    return bytes(output)
+
+
+def gif_bytes(parsed_file, frame_indices=None, loops=0):
+    """Encodes frames as an animated GIF.
+
+    Frames after the first only store the region that changed. Frames
+    identical to the previous one extend its delay instead of being stored.
+    A frame making visible pixels transparent can't be drawn over the
+    previous one, so the previous frame is stored whole and cleared once
+    shown. loops is the number of times the animation repeats, 0 looping
+    forever. See gif_palette() for how colors are reduced.
+    """
+    np = require_numpy()
+    frame_indices = export_frames(parsed_file, frame_indices)
+    # [rect, image, delay in milliseconds, disposal]
+    frames = []
+    for (canvas, previous, rect, duration) in frame_updates(parsed_file, frame_indices):
+        if rect is None:
+            frames[-1][2] += duration
+            continue
+        (x, y, width, height) = rect
+        image = canvas[y:y + height, x:x + width].copy()
+        if frames and ((previous[..., 3] >= 128) & (image[..., 3] < 128)).any():
+            # Redraw the previous frame whole so clearing it clears everything
+            previous_canvas = canvas.copy()
+            previous_canvas[y:y + height, x:x + width] = previous
+            frames[-1][0] = (0, 0, canvas.shape[1], canvas.shape[0])
+            frames[-1][1] = previous_canvas
+            frames[-1][3] = GIF_DISPOSE_BACKGROUND
+            rect = (0, 0, canvas.shape[1], canvas.shape[0])
+            image = canvas.copy()
+        frames.append([rect, image, duration, GIF_DISPOSE_NONE])
+
+    colors, mapping = gif_palette([image for (_, image, _, _) in frames])
+    transparent_index = len(colors)
+    (height, width) = canvas.shape[:2]
+    palette_bits = max(1, (transparent_index).bit_length())
+    palette = np.zeros((1 << palette_bits, 3), dtype=np.uint8)
+    palette[:len(colors)] = colors
+    parts = [
+        b'GIF89a',
+        # Logical screen: global color table of 2 ** palette_bits colors
+        struct.pack('<HHBBB', width, height, 0x80 | ((palette_bits - 1) << 4) | (palette_bits - 1), 0, 0),
+        palette.tobytes(),
+        # Netscape looping extension
+        b'\x21\xFF\x0BNETSCAPE2.0\x03\x01' + struct.pack('<H', loops) + b'\x00'
+    ]
+    min_code_size = max(2, palette_bits)
+    for ((x, y, frame_width, frame_height), image, delay, disposal) in frames:
+        # Delays are in hundredths of seconds
+        delay = min(int(round(delay / 10)), max_gif_delay)
+        parts.append(struct.pack('<BBBBHBB', 0x21, 0xF9, 4, (disposal << 2) | 1, delay, transparent_index, 0))
+        parts.append(struct.pack('<BHHHHB', 0x2C, x, y, frame_width, frame_height, 0))
+        data = lzw_encode(mapping(image).tobytes(), min_code_size)
+        parts.append(bytes((min_code_size,)))
+        for start in range(0, len(data), 255):
+            block = data[start:start + 255]
+            parts.append(bytes((len(block),)) + block)
+        parts.append(b'\x00')
+    parts.append(b'\x3B')
+    return b''.join(parts)
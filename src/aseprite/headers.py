@@ -6,6 +6,24 @@ class HeaderFlags(IntFlag):
 
 # Spec version : commit 10dda30a15a58d09e561a59594f348b4db3a4405
 class Header(object):
+    __slots__ = (
+        'filesize',
+        'magic_number',
+        'num_frames',
+        'width',
+        'height',
+        'color_depth',
+        'flags',
+        'speed_deprecated',
+        'palette_mask',
+        'num_colors',
+        'pixel_width',
+        'pixel_height',
+        'grid_x_position',
+        'grid_y_position',
+        'grid_width',
+        'grid_height'
+    )
     header_format = (
         "<I" # File size
         + "H" # Magic Number (0xA5E0)
@@ -30,9 +48,10 @@ class Header(object):
     )
     # Note I'm not sure if the combinations of all bitmasks must fill all the bits counted in the tile ID.
     header_size = 128
+    header_struct = Struct(header_format)
 
     def __init__(self, data, data_offset = 0):
-        header_struct = Struct(Header.header_format)
+        header_struct = Header.header_struct
 
         (
             self.filesize,
@@ -57,11 +76,13 @@ class Header(object):
             raise ValueError('Incorrect magic number, expected {:x}, got {:x}'.format(0xA5E0, self.magic_number))
 
 class Frame(object):
+    __slots__ = ('size', 'magic_number', 'num_chunks', 'frame_duration', 'chunks')
     frame_format = '<IHHH6x'
     frame_size = 16
+    frame_struct = Struct(frame_format)
 
     def __init__(self, data, data_offset = 0):
-        frame_struct = Struct(Frame.frame_format)
+        frame_struct = Frame.frame_struct
         (
             self.size,
             self.magic_number,
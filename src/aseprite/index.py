@@ -0,0 +1,126 @@
+from struct import Struct
+
+from .headers import Header, Frame
+from .chunks import Chunk
+
+
+class ChunkEntry(object):
+    """Location of a chunk in the file."""
+    __slots__ = ('chunk_type', 'offset', 'size')
+
+    def __init__(self, chunk_type, offset, size):
+        self.chunk_type = chunk_type
+        self.offset = offset
+        self.size = size
+
+
+class FrameEntry(object):
+    """Location of a frame and its chunks in the file."""
+    __slots__ = ('offset', 'size', 'frame_duration', 'chunks')
+
+    def __init__(self, offset, size, frame_duration, chunks):
+        self.offset = offset
+        self.size = size
+        self.frame_duration = frame_duration
+        self.chunks = chunks
+
+
+class FileIndex(object):
+    """Offsets and sizes of every frame and chunk of a file.
+
+    Scanning only reads the frame and chunk headers, so it's much cheaper than
+    a full parse and allows parsing frames individually afterwards. An index
+    can be saved to a sidecar file to skip the scan on the next load.
+    """
+    index_magic = b'ASEI'
+    index_version = 1
+    index_head_format = (
+        '<4s' # Magic
+        + 'H' # Index format version
+        + 'I' # File size, as stored in the header
+        + 'H' # Number of frames
+    )
+    index_frame_format = (
+        '<I' # Frame offset
+        + 'I' # Frame size
+        + 'H' # Frame duration
+        + 'I' # Number of chunks
+    )
+    index_chunk_format = (
+        '<H' # Chunk type
+        + 'I' # Chunk offset
+        + 'I' # Chunk size
+    )
+    index_head_struct = Struct(index_head_format)
+    index_frame_struct = Struct(index_frame_format)
+    index_chunk_struct = Struct(index_chunk_format)
+
+    def __init__(self, filesize, frames):
+        self.filesize = filesize
+        self.frames = frames
+
+    @staticmethod
+    def scan(data, header=None):
+        """Builds the index of a file by walking its frame and chunk headers."""
+        if header is None:
+            header = Header(data)
+        frames = []
+        frame_offset = Header.header_size
+        for frame_index in range(header.num_frames):
+            frame = Frame(data, frame_offset)
+            chunks = []
+            chunk_offset = frame_offset + Frame.frame_size
+            for chunk_index in range(frame.num_chunks):
+                chunk = Chunk(data, chunk_offset)
+                chunks.append(ChunkEntry(chunk.chunk_type, chunk_offset, chunk.chunk_size))
+                chunk_offset += chunk.chunk_size
+            frames.append(FrameEntry(frame_offset, frame.size, frame.frame_duration, chunks))
+            frame_offset += frame.size
+        return FileIndex(header.filesize, frames)
+
+    def matches(self, header):
+        """Checks that the index was plausibly built from the file with that header."""
+        return self.filesize == header.filesize and len(self.frames) == header.num_frames
+
+    def to_bytes(self):
+        head_struct = FileIndex.index_head_struct
+        frame_struct = FileIndex.index_frame_struct
+        chunk_struct = FileIndex.index_chunk_struct
+        parts = [head_struct.pack(FileIndex.index_magic, FileIndex.index_version, self.filesize, len(self.frames))]
+        for frame in self.frames:
+            parts.append(frame_struct.pack(frame.offset, frame.size, frame.frame_duration, len(frame.chunks)))
+            for chunk in frame.chunks:
+                parts.append(chunk_struct.pack(chunk.chunk_type, chunk.offset, chunk.size))
+        return b''.join(parts)
+
+    @staticmethod
+    def from_bytes(data):
+        head_struct = FileIndex.index_head_struct
+        frame_struct = FileIndex.index_frame_struct
+        chunk_struct = FileIndex.index_chunk_struct
+        (magic, version, filesize, num_frames) = head_struct.unpack_from(data, 0)
+        if magic != FileIndex.index_magic:
+            raise ValueError('Incorrect index magic, expected {}, got {}'.format(FileIndex.index_magic, magic))
+        if version != FileIndex.index_version:
+            raise ValueError('Unsupported index version {}'.format(version))
+
+        frames = []
+        index_offset = head_struct.size
+        for frame_index in range(num_frames):
+            (offset, size, frame_duration, num_chunks) = frame_struct.unpack_from(data, index_offset)
+            index_offset += frame_struct.size
+            chunks = []
+            for chunk_index in range(num_chunks):
+                chunks.append(ChunkEntry(*chunk_struct.unpack_from(data, index_offset)))
+                index_offset += chunk_struct.size
+            frames.append(FrameEntry(offset, size, frame_duration, chunks))
+        return FileIndex(filesize, frames)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return FileIndex.from_bytes(f.read())
@@ -0,0 +1,146 @@
+from .chunks import (
+    OldPaleteChunk_0x0004,
+    OldPaleteChunk_0x0011,
+    PaletteChunk,
+    require_numpy
+)
+
+
+def palette_rgba(parsed_file):
+    """Returns the file's palette as a (num_colors, 4) uint8 RGBA array.
+
+    The palette chunks of the first frame are applied in order. Files
+    without one fall back to their old palette chunks, whose colors are
+    opaque (0x0011's 6-bit channels being scaled to 8 bits). At least 256
+    colors are returned, unset ones being transparent black.
+    """
+    np = require_numpy()
+    chunks = parsed_file.frame(0).chunks
+    palettes = [chunk for chunk in chunks if isinstance(chunk, PaletteChunk)]
+    num_colors = max([256] + [chunk.palette_size for chunk in palettes])
+    colors = np.zeros((num_colors, 4), dtype=np.uint8)
+    if palettes:
+        for chunk in palettes:
+            chunk_colors = np.frombuffer(chunk.rgba, dtype=np.uint8).reshape(-1, 4)
+            first = chunk.first_color_index
+            chunk_colors = chunk_colors[:max(0, num_colors - first)]
+            colors[first:first + len(chunk_colors)] = chunk_colors
+        return colors
+
+    for chunk in chunks:
+        if isinstance(chunk, (OldPaleteChunk_0x0004, OldPaleteChunk_0x0011)):
+            index = 0
+            for packet in chunk.packets:
+                index += packet.previous_packet_skip
+                packet_colors = np.array(packet.colors, dtype=np.uint16).reshape(-1, 3)[:max(0, num_colors - index)]
+                if isinstance(chunk, OldPaleteChunk_0x0011):
+                    packet_colors = (packet_colors * 255 + 31) // 63
+                colors[index:index + len(packet_colors), :3] = packet_colors
+                colors[index:index + len(packet_colors), 3] = 255
+                index += len(packet_colors)
+    return colors
+
+
+def palette_size(parsed_file):
+    """Returns the number of colors of the file's palette, without palette_rgba()'s padding.
+
+    That's the largest size of the palette chunks of the first frame, or the
+    header's color count for files with old palette chunks only (0 meaning
+    256).
+    """
+    sizes = [chunk.palette_size for chunk in parsed_file.frame(0).chunks if isinstance(chunk, PaletteChunk)]
+    if sizes:
+        return max(sizes)
+    return parsed_file.header.num_colors or 256
+
+
+def indexed_lut(parsed_file, transparent_index=True):
+    """Returns the (256, 4) uint8 RGBA lookup table of an indexed file's pixels.
+
+    Unless transparent_index is False, the header's palette_mask index is
+    fully transparent, as it is on all the layers but the background.
+    """
+    lut = palette_rgba(parsed_file)[:256].copy()
+    if transparent_index:
+        lut[parsed_file.header.palette_mask] = 0
+    return lut
+
+
+def expand_indexed(pixels, lut, out=None):
+    """Converts an array of palette indices to RGBA through a lookup table, in one pass.
+
+    out can be a preallocated uint8 array of shape pixels.shape + (4,).
+    """
+    np = require_numpy()
+    return np.take(lut, pixels, axis=0, out=out)
+
+
+class PaletteMapper(object):
+    """Maps RGBA colors to the index of the nearest palette color.
+
+    The nearest color is the closest in RGB space. Each distinct color is
+    only searched once: results are memoized in a table covering the 2 ** 24
+    RGB colors (32 MiB, allocated on first use) shared by all the images
+    mapped afterwards. Pixels whose alpha is under alpha_threshold map to
+    transparent_index, which is never picked for opaque pixels. Requires
+    NumPy.
+    """
+
+    def __init__(self, colors, transparent_index=None, alpha_threshold=128):
+        np = require_numpy()
+        colors = np.asarray(colors, dtype=np.uint8)
+        self.colors = colors
+        self.transparent_index = transparent_index
+        self.alpha_threshold = alpha_threshold
+        candidates = np.arange(len(colors))
+        if transparent_index is not None:
+            candidates = candidates[candidates != transparent_index]
+        self.candidates = candidates
+        self.candidate_colors = colors[candidates, :3].astype(np.int32)
+        self.index_type = np.uint8 if len(colors) <= 256 else np.uint16
+        # RGB key -> nearest index, -1 if not searched yet
+        self.table = None
+        self.table_type = np.int16 if len(colors) <= 0x7FFF else np.int32
+
+    @classmethod
+    def from_file(cls, parsed_file, alpha_threshold=128):
+        """Returns a mapper to a file's palette, its palette_mask index standing for transparency.
+
+        Only the colors of the palette are candidates, not the transparent
+        black palette_rgba() pads it with.
+        """
+        colors = palette_rgba(parsed_file)[:palette_size(parsed_file)]
+        return cls(colors, parsed_file.header.palette_mask, alpha_threshold)
+
+    def nearest(self, keys):
+        """Searches the nearest palette indices of an array of distinct RGB keys."""
+        np = require_numpy()
+        rgb = np.stack(((keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF), axis=1).astype(np.int32)
+        nearest = np.empty(len(keys), dtype=np.int32)
+        # Bounds the (colors, palette) distance matrix
+        step = max(1, (1 << 20) // max(1, len(self.candidates)))
+        for start in range(0, len(keys), step):
+            differences = rgb[start:start + step, None, :] - self.candidate_colors[None, :, :]
+            distances = (differences * differences).sum(axis=2)
+            nearest[start:start + step] = self.candidates[distances.argmin(axis=1)]
+        return nearest
+
+    def map(self, pixels, out=None):
+        """Returns the palette indices of (..., 4) RGBA pixels, written to out if given."""
+        np = require_numpy()
+        if self.table is None:
+            self.table = np.full(1 << 24, -1, dtype=self.table_type)
+        rgb = pixels[..., :3].astype(np.int32)
+        keys = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+        indices = self.table[keys]
+        missing = indices < 0
+        if missing.any():
+            missing_keys = np.unique(keys[missing])
+            self.table[missing_keys] = self.nearest(missing_keys)
+            indices = self.table[keys]
+        if out is None:
+            out = np.empty(indices.shape, dtype=self.index_type)
+        out[...] = indices
+        if self.transparent_index is not None:
+            out[pixels[..., 3] < self.alpha_threshold] = self.transparent_index
+        return out
@@ -0,0 +1,244 @@
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from .headers import Frame
+from .chunks import (
+    Chunk,
+    OldPaleteChunk_0x0004,
+    OldPaleteChunk_0x0011,
+    LayerChunk,
+    LayerGroupChunk,
+    CelChunk,
+    CelExtraChunk,
+    ColorProfileChunk,
+    ExternalFilesChunk,
+    MaskChunk,
+    FrameTagsChunk,
+    PathChunk,
+    PaletteChunk,
+    UserDataChunk,
+    SliceChunk,
+    TilesetChunk
+)
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the parsed representation of a file changes, which
+# invalidates the parses stored by cache.AssetCache.
+parser_version = 1
+
+
+class ChunkTypeStats(object):
+    """Totals of the chunks of one type met while parsing."""
+    __slots__ = ('count', 'bytes', 'decompressed_bytes', 'time')
+
+    def __init__(self):
+        self.count = 0
+        # Size of the chunks, headers included
+        self.bytes = 0
+        # Size of the data decompressed while parsing
+        self.decompressed_bytes = 0
+        # Seconds spent in the chunk handlers
+        self.time = 0.0
+
+
+class SkippedChunk(NamedTuple):
+    chunk_type: int
+    offset: int
+    size: int
+    reason: str
+
+
+class ParseStats(object):
+    """Counts, sizes and parse times per chunk type, and the chunks that were skipped.
+
+    Decompression deferred to decode_workers runs for all the chunks at once,
+    its time is only counted in decode_time.
+    """
+
+    def __init__(self):
+        # Chunk type -> ChunkTypeStats
+        self.chunk_types = {}
+        self.skipped = []
+        # Seconds spent decompressing deferred data on the thread pool
+        self.decode_time = 0.0
+
+    def chunk_type(self, chunk_type):
+        """Returns the ChunkTypeStats of a chunk type, creating it if needed."""
+        stats = self.chunk_types.get(chunk_type)
+        if stats is None:
+            stats = self.chunk_types[chunk_type] = ChunkTypeStats()
+        return stats
+
+    @property
+    def time(self):
+        """Total seconds spent in the chunk handlers and the deferred decompression."""
+        return sum(stats.time for stats in self.chunk_types.values()) + self.decode_time
+
+    def summary(self):
+        """Returns a table of the stats, the most expensive chunk types first."""
+        lines = ['Parsed in {:.3f} ms, {} chunks skipped'.format(self.time * 1000, len(self.skipped))]
+        for chunk_type, stats in sorted(self.chunk_types.items(), key=lambda item: -item[1].time):
+            lines.append('0x{:04x}: {} chunks, {} bytes, {} decompressed bytes, {:.3f} ms'.format(
+                chunk_type, stats.count, stats.bytes, stats.decompressed_bytes, stats.time * 1000))
+        return '\n'.join(lines)
+
+
+class ParseContext(object):
+    """Parsing options and state shared by the chunk handlers of a file."""
+
+    def __init__(self, lazy=False, cel_cache=None, layer_index=0, color_depth=None, decode_workers=None, stats=None):
+        self.lazy = lazy
+        self.cel_cache = cel_cache
+        self.color_depth = color_depth
+        # Index given to the next parsed layer
+        self.layer_index = layer_index
+        # If set, compressed data is queued during the chunk walk and
+        # decompressed afterwards by that many threads.
+        self.decode_workers = decode_workers
+        self.pending_chunks = []
+        # ParseStats filled while parsing, if any
+        self.stats = stats
+
+    def decompress(self, chunk):
+        """Decompresses a chunk's payload, or queues it if decode_workers is set."""
+        if self.decode_workers:
+            self.pending_chunks.append(chunk)
+        else:
+            self.set_decompressed(chunk, zlib.decompress(chunk.payload()))
+
+    def set_decompressed(self, chunk, decoded):
+        chunk.set_data(decoded)
+        if self.stats is not None:
+            self.stats.chunk_type(chunk.chunk_type).decompressed_bytes += len(decoded)
+
+    def decompress_pending(self):
+        """Decompresses the queued chunks' data on a thread pool, zlib releasing the GIL."""
+        if not self.pending_chunks:
+            return
+        chunks = self.pending_chunks
+        self.pending_chunks = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.decode_workers) as executor:
+            # map keeps the chunks' order
+            decoded_data = executor.map(zlib.decompress, [chunk.payload() for chunk in chunks])
+            for chunk, decoded in zip(chunks, decoded_data):
+                self.set_decompressed(chunk, decoded)
+        if self.stats is not None:
+            self.stats.decode_time += time.perf_counter() - start
+
+
+# Chunk type -> handler(data, data_offset, context)
+chunk_handlers = {}
+
+
+def register_chunk_type(chunk_id, handler):
+    """Registers the handler parsing the chunks of type chunk_id.
+
+    The handler is called as handler(data, data_offset, context), data_offset
+    being the offset of the chunk's header, and returns the parsed chunk or
+    None to skip it. Chunk classes constructed from (data, data_offset) can be
+    wrapped with chunk_class_handler(). A handler registered for an already
+    supported chunk type replaces the built-in one.
+    """
+    chunk_handlers[chunk_id] = handler
+
+
+def chunk_class_handler(chunk_class):
+    """Wraps a chunk class constructed from (data, data_offset) as a chunk handler."""
+    def handler(data, data_offset, context):
+        return chunk_class(data, data_offset)
+    return handler
+
+
+def parse_layer(data, data_offset, context):
+    layer = LayerChunk(data, context.layer_index, data_offset)
+    context.layer_index += 1
+    if layer.layer_type == 0 or layer.layer_type == 2:
+        return layer
+    if layer.layer_type == 1:
+        return LayerGroupChunk(layer)
+    logger.info('Skipped layer with unsupported layer type 0x%04x', layer.layer_type)
+    return None
+
+
+def parse_cel(data, data_offset, context):
+    # Extracted here rather than by the cel so the decompression is accounted for.
+    cel = CelChunk(data, data_offset, True, context.cel_cache, context.color_depth)
+    if not context.lazy and cel.has_pending_data():
+        if cel.compressed:
+            context.decompress(cel)
+        else:
+            cel.get_data()
+    return cel
+
+
+def parse_tileset(data, data_offset, context):
+    tileset = TilesetChunk(data, data_offset, True)
+    if not context.lazy and tileset.has_pending_data():
+        context.decompress(tileset)
+    return tileset
+
+
+for chunk_class in (
+    OldPaleteChunk_0x0004,
+    OldPaleteChunk_0x0011,
+    CelExtraChunk,
+    ColorProfileChunk,
+    ExternalFilesChunk,
+    MaskChunk,
+    FrameTagsChunk,
+    PathChunk,
+    PaletteChunk,
+    UserDataChunk,
+    SliceChunk
+):
+    register_chunk_type(chunk_class.chunk_id, chunk_class_handler(chunk_class))
+register_chunk_type(LayerChunk.chunk_id, parse_layer)
+register_chunk_type(CelChunk.chunk_id, parse_cel)
+register_chunk_type(TilesetChunk.chunk_id, parse_tileset)
+
+
+def parse_frame(data, data_offset, context):
+    """Parses the frame at data_offset and its chunks.
+
+    Skipped chunks are logged and, like the parse time of each chunk type,
+    recorded in the context's stats if it has any.
+    """
+    chunk_struct = Chunk.chunk_struct
+    stats = context.stats
+    frame = Frame(data, data_offset)
+    frame.chunks = []
+    data_offset += Frame.frame_size
+    for c in range(frame.num_chunks):
+        (chunk_size, chunk_type) = chunk_struct.unpack_from(data, data_offset)
+        logger.debug('Chunk 0x%04x of %d bytes at offset %d', chunk_type, chunk_size, data_offset)
+        handler = chunk_handlers.get(chunk_type)
+        if handler is None:
+            chunk = None
+            reason = 'unsupported chunk type'
+            logger.info('Skipped chunk of unsupported type 0x%04x at offset %d', chunk_type, data_offset)
+        elif stats is not None:
+            start = time.perf_counter()
+            chunk = handler(data, data_offset, context)
+            stats.chunk_type(chunk_type).time += time.perf_counter() - start
+            reason = 'rejected by its handler'
+        else:
+            chunk = handler(data, data_offset, context)
+            reason = 'rejected by its handler'
+
+        if chunk is not None:
+            frame.chunks.append(chunk)
+        if stats is not None:
+            type_stats = stats.chunk_type(chunk_type)
+            type_stats.count += 1
+            type_stats.bytes += chunk_size
+            if chunk is None:
+                stats.skipped.append(SkippedChunk(chunk_type, data_offset, chunk_size, reason))
+
+        data_offset += chunk_size
+
+    return frame
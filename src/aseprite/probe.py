@@ -0,0 +1,119 @@
+import os
+
+from .headers import Header, Frame
+from .chunks import (
+    Chunk,
+    LayerChunk,
+    FrameTagsChunk,
+    PaletteChunk,
+    UserDataChunk,
+    SliceChunk
+)
+from .parser import ParseContext, chunk_handlers
+from .stream import read_exactly
+
+# Chunk types parsed by probe(), the others are skipped without being read.
+probed_chunk_types = (
+    LayerChunk.chunk_id,
+    FrameTagsChunk.chunk_id,
+    PaletteChunk.chunk_id,
+    UserDataChunk.chunk_id,
+    SliceChunk.chunk_id
+)
+
+
+class ProbeResult(object):
+    """A file's metadata, as read by probe()."""
+
+    def __init__(self, header, frame_durations, layers, tags, slices, palettes, user_data):
+        self.header = header
+        self.frame_durations = frame_durations
+        self.layers = layers
+        # FrameTag records of the file's tags
+        self.tags = tags
+        self.slices = slices
+        self.palettes = palettes
+        self.user_data = user_data
+
+    @property
+    def width(self):
+        return self.header.width
+
+    @property
+    def height(self):
+        return self.header.height
+
+    @property
+    def color_depth(self):
+        return self.header.color_depth
+
+    @property
+    def num_frames(self):
+        return self.header.num_frames
+
+    @property
+    def duration(self):
+        """Total duration of the frames, in milliseconds."""
+        return sum(self.frame_durations)
+
+    @property
+    def layer_names(self):
+        return [layer.name for layer in self.layers]
+
+    @property
+    def tag_names(self):
+        return [tag.name for tag in self.tags]
+
+    @property
+    def slice_names(self):
+        return [chunk.name for chunk in self.slices]
+
+
+def probe_file(fileobj):
+    # The file may start past the beginning of fileobj
+    start = fileobj.tell()
+    header = Header(read_exactly(fileobj, Header.header_size))
+    context = ParseContext(lazy=True, color_depth=header.color_depth)
+    frame_durations = []
+    chunks = []
+    frame_offset = Header.header_size
+    for frame_index in range(header.num_frames):
+        frame = Frame(read_exactly(fileobj, Frame.frame_size))
+        frame_durations.append(frame.frame_duration)
+        for chunk_index in range(frame.num_chunks):
+            chunk_header = read_exactly(fileobj, Chunk.chunk_struct.size)
+            (chunk_size, chunk_type) = Chunk.chunk_struct.unpack(chunk_header)
+            handler = chunk_handlers.get(chunk_type)
+            if chunk_type in probed_chunk_types and handler is not None:
+                chunk = handler(chunk_header + read_exactly(fileobj, chunk_size - len(chunk_header)), 0, context)
+                if chunk is not None:
+                    chunks.append(chunk)
+            else:
+                fileobj.seek(chunk_size - len(chunk_header), os.SEEK_CUR)
+        # Skips whatever follows the chunks, if anything
+        frame_offset += frame.size
+        fileobj.seek(start + frame_offset)
+
+    return ProbeResult(
+        header,
+        frame_durations,
+        [chunk for chunk in chunks if isinstance(chunk, LayerChunk)],
+        [tag for chunk in chunks if isinstance(chunk, FrameTagsChunk) for tag in chunk.tags],
+        [chunk for chunk in chunks if isinstance(chunk, SliceChunk)],
+        [chunk for chunk in chunks if isinstance(chunk, PaletteChunk)],
+        [chunk for chunk in chunks if isinstance(chunk, UserDataChunk)]
+    )
+
+
+def probe(path):
+    """Reads a file's metadata without loading its pixels.
+
+    Only the header, the frame and chunk headers and the layer, tag, slice,
+    palette and user data chunks are read, the file position skips over
+    everything else (cels, tilesets...). path can also be a seekable binary
+    file object, read from its current position.
+    """
+    if hasattr(path, 'read'):
+        return probe_file(path)
+    with open(path, 'rb') as f:
+        return probe_file(f)
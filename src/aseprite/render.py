@@ -0,0 +1,471 @@
+from .chunks import (
+    LayerGroupChunk,
+    CelChunk,
+    TilesetChunk,
+    require_numpy
+)
+from .palette import palette_rgba
+
+# LayerChunk.flags
+LAYER_VISIBLE = 1
+LAYER_BACKGROUND = 8
+LAYER_REFERENCE = 64
+
+# LayerChunk.blend_mode
+BLEND_NORMAL = 0
+BLEND_MULTIPLY = 1
+BLEND_SCREEN = 2
+BLEND_OVERLAY = 3
+BLEND_DARKEN = 4
+BLEND_LIGHTEN = 5
+BLEND_COLOR_DODGE = 6
+BLEND_COLOR_BURN = 7
+BLEND_HARD_LIGHT = 8
+BLEND_SOFT_LIGHT = 9
+BLEND_DIFFERENCE = 10
+BLEND_EXCLUSION = 11
+BLEND_HUE = 12
+BLEND_SATURATION = 13
+BLEND_COLOR = 14
+BLEND_LUMINOSITY = 15
+BLEND_ADDITION = 16
+BLEND_SUBTRACT = 17
+BLEND_DIVIDE = 18
+
+
+# Blend functions, working on float RGB arrays in [0, 1] (backdrop, source).
+# They follow Aseprite's, which are the W3C compositing ones.
+def _multiply(np, b, s):
+    return b * s
+
+def _screen(np, b, s):
+    return b + s - b * s
+
+def _hard_light(np, b, s):
+    return np.where(s <= 0.5, _multiply(np, b, 2 * s), _screen(np, b, 2 * s - 1))
+
+def _overlay(np, b, s):
+    return _hard_light(np, s, b)
+
+def _darken(np, b, s):
+    return np.minimum(b, s)
+
+def _lighten(np, b, s):
+    return np.maximum(b, s)
+
+def _color_dodge(np, b, s):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dodged = np.minimum(1, b / (1 - s))
+    return np.where(b == 0, 0, np.where(s >= 1, 1, dodged))
+
+def _color_burn(np, b, s):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        burnt = 1 - np.minimum(1, (1 - b) / s)
+    return np.where(b >= 1, 1, np.where(s <= 0, 0, burnt))
+
+def _soft_light(np, b, s):
+    d = np.where(b <= 0.25, ((16 * b - 12) * b + 4) * b, np.sqrt(b))
+    return np.where(s <= 0.5, b - (1 - 2 * s) * b * (1 - b), b + (2 * s - 1) * (d - b))
+
+def _difference(np, b, s):
+    return np.abs(b - s)
+
+def _exclusion(np, b, s):
+    return b + s - 2 * b * s
+
+def _addition(np, b, s):
+    return np.minimum(b + s, 1)
+
+def _subtract(np, b, s):
+    return np.maximum(b - s, 0)
+
+def _divide(np, b, s):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        divided = b / s
+    return np.where(b == 0, 0, np.where(b >= s, 1, divided))
+
+def _lum(np, c):
+    return 0.3 * c[..., 0] + 0.59 * c[..., 1] + 0.11 * c[..., 2]
+
+def _clip_color(np, c):
+    l = _lum(np, c)[..., None]
+    n = c.min(axis=-1, keepdims=True)
+    x = c.max(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = np.where(n < 0, l + (c - l) * l / (l - n), c)
+        c = np.where(x > 1, l + (c - l) * (1 - l) / (x - l), c)
+    return c
+
+def _set_lum(np, c, l):
+    return _clip_color(np, c + (l - _lum(np, c))[..., None])
+
+def _sat(np, c):
+    return c.max(axis=-1) - c.min(axis=-1)
+
+def _set_sat(np, c, s):
+    n = c.min(axis=-1, keepdims=True)
+    x = c.max(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(x > n, (c - n) * s[..., None] / (x - n), 0)
+
+def _hue(np, b, s):
+    return _set_lum(np, _set_sat(np, s, _sat(np, b)), _lum(np, b))
+
+def _saturation(np, b, s):
+    return _set_lum(np, _set_sat(np, b, _sat(np, s)), _lum(np, b))
+
+def _color(np, b, s):
+    return _set_lum(np, s, _lum(np, b))
+
+def _luminosity(np, b, s):
+    return _set_lum(np, b, _lum(np, s))
+
+blend_functions = {
+    BLEND_MULTIPLY: _multiply,
+    BLEND_SCREEN: _screen,
+    BLEND_OVERLAY: _overlay,
+    BLEND_DARKEN: _darken,
+    BLEND_LIGHTEN: _lighten,
+    BLEND_COLOR_DODGE: _color_dodge,
+    BLEND_COLOR_BURN: _color_burn,
+    BLEND_HARD_LIGHT: _hard_light,
+    BLEND_SOFT_LIGHT: _soft_light,
+    BLEND_DIFFERENCE: _difference,
+    BLEND_EXCLUSION: _exclusion,
+    BLEND_HUE: _hue,
+    BLEND_SATURATION: _saturation,
+    BLEND_COLOR: _color,
+    BLEND_LUMINOSITY: _luminosity,
+    BLEND_ADDITION: _addition,
+    BLEND_SUBTRACT: _subtract,
+    BLEND_DIVIDE: _divide,
+}
+
+
+def blend(backdrop, source, opacity=1.0, blend_mode=BLEND_NORMAL):
+    """Blends a float RGBA source over a same-sized float RGBA backdrop, in place.
+
+    Like Aseprite, the blend mode computes the source's color against the
+    backdrop, which is then alpha-composited over the backdrop.
+    """
+    np = require_numpy()
+    source_alpha = source[..., 3] * opacity
+    backdrop_alpha = backdrop[..., 3]
+    backdrop_color = backdrop[..., :3]
+    color = source[..., :3]
+    if blend_mode in blend_functions:
+        blended = blend_functions[blend_mode](np, backdrop_color, color)
+        # Nothing to blend with on a transparent backdrop
+        color = np.where(backdrop_alpha[..., None] > 0, blended, color)
+
+    result_alpha = source_alpha + backdrop_alpha - backdrop_alpha * source_alpha
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(result_alpha > 0, source_alpha / result_alpha, 0)
+    backdrop[..., :3] = backdrop_color + (color - backdrop_color) * weight[..., None]
+    backdrop[..., 3] = result_alpha
+    return backdrop
+
+
+def palette_lut(parsed_file):
+    """Returns a (256, 4) uint8 array of the file's palette colors."""
+    return palette_rgba(parsed_file)[:256]
+
+
+def pixels_to_rgba(parsed_file, pixels, layer=None, lut=None):
+    """Converts pixels as returned by CelChunk.to_numpy() to a float RGBA array in [0, 1]."""
+    np = require_numpy()
+    depth = parsed_file.header.color_depth
+    if depth == 32:
+        rgba = pixels
+    elif depth == 16:
+        rgba = np.empty(pixels.shape[:2] + (4,), dtype=np.uint8)
+        rgba[..., :3] = pixels[..., 0:1]
+        rgba[..., 3] = pixels[..., 1]
+    else:
+        if lut is None:
+            lut = palette_lut(parsed_file)
+        rgba = lut[pixels]
+        # The mask index is transparent, except on the background layer
+        if layer is None or not layer.flags & LAYER_BACKGROUND:
+            rgba[pixels == parsed_file.header.palette_mask, 3] = 0
+    return rgba.astype(np.float32) / 255
+
+
+def tileset_tiles(parsed_file):
+    """Maps the tileset ids to their tiles, as returned by TilesetChunk.tiles()."""
+    tilesets = {}
+    for chunk in parsed_file.frame(0).chunks:
+        if isinstance(chunk, TilesetChunk):
+            tiles = chunk.tiles(parsed_file.header.color_depth)
+            if tiles is not None:
+                tilesets[chunk.tileset_id] = tiles
+    return tilesets
+
+
+def tilemap_pixels(cel, tiles, region=None):
+    """Lays out the tiles of a tilemap cel into an image shaped like CelChunk.to_numpy()'s.
+
+    tiles is the cel's tileset as returned by TilesetChunk.tiles(). Tiles
+    are transposed if flipped diagonally (square tiles only), then mirrored
+    if flipped on X or Y. region restricts the image to a (x, y, width,
+    height) rectangle in pixels relative to the cel, only the tiles it covers
+    are laid out. Tile ids missing from the tileset give the empty tile 0.
+    """
+    np = require_numpy()
+    decoded = cel.decode_tiles()
+    num_tiles, tile_height, tile_width = tiles.shape[:3]
+    if region is None:
+        region = (0, 0, decoded.ids.shape[1] * tile_width, decoded.ids.shape[0] * tile_height)
+    x, y, width, height = region
+    first_row = y // tile_height
+    first_column = x // tile_width
+    tile_rows = slice(first_row, -(-(y + height) // tile_height))
+    tile_columns = slice(first_column, -(-(x + width) // tile_width))
+
+    ids = decoded.ids[tile_rows, tile_columns]
+    ids = np.where(ids < num_tiles, ids, 0)
+    # (rows, columns, tile height, tile width[, channels])
+    laid_out = tiles[ids]
+    if tile_width == tile_height:
+        flipped = decoded.flip_diagonal[tile_rows, tile_columns]
+        if flipped.any():
+            laid_out[flipped] = laid_out[flipped].swapaxes(1, 2)
+    flipped = decoded.flip_x[tile_rows, tile_columns]
+    if flipped.any():
+        laid_out[flipped] = laid_out[flipped][:, :, ::-1]
+    flipped = decoded.flip_y[tile_rows, tile_columns]
+    if flipped.any():
+        laid_out[flipped] = laid_out[flipped][:, ::-1]
+
+    (rows, columns) = ids.shape
+    pixels = laid_out.swapaxes(1, 2).reshape((rows * tile_height, columns * tile_width) + tiles.shape[3:])
+    top = y - first_row * tile_height
+    left = x - first_column * tile_width
+    return pixels[top:top + height, left:left + width]
+
+
+def frame_cels(parsed_file, frame_index):
+    """Maps the layer indices to the cels of a frame, linked cels being replaced by their source (None if missing)."""
+    cels = {}
+    for chunk in parsed_file.frame(frame_index).chunks:
+        if isinstance(chunk, CelChunk):
+            cels[chunk.layer_index] = chunk.link_source if chunk.cel_type == 1 else chunk
+    return cels
+
+
+def layers_by_index(parsed_file):
+    """Maps the layer indices to the layers of a file.
+
+    Layers of unsupported types are skipped but still counted, so a layer's
+    position in parsed_file.layers isn't always its index.
+    """
+    return {layer.layer_index: layer for layer in parsed_file.layers}
+
+
+def cel_bounds(cel, layer, tilesets):
+    """Returns the (x, y, width, height) rectangle of the canvas a layer's cel covers, or None if it draws nothing.
+
+    cel must be a resolved cel, as returned by frame_cels(), tilesets the
+    tilesets as returned by tileset_tiles().
+    """
+    if cel.cel_type == 3:
+        tiles = tilesets.get(layer.tileset_index)
+        if tiles is None:
+            return None
+        return (cel.x_pos, cel.y_pos, cel.data['width'] * tiles.shape[2], cel.data['height'] * tiles.shape[1])
+    if cel.cel_type in (0, 2):
+        return (cel.x_pos, cel.y_pos, cel.data['width'], cel.data['height'])
+    return None
+
+
+def union_rect(first, second):
+    """Returns the smallest (x, y, width, height) rectangle holding two rectangles, either can be None."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    left = min(first[0], second[0])
+    top = min(first[1], second[1])
+    right = max(first[0] + first[2], second[0] + second[2])
+    bottom = max(first[1] + first[3], second[1] + second[3])
+    return (left, top, right - left, bottom - top)
+
+
+def clip_rect(rect, width, height):
+    """Clips a rectangle to a width x height canvas, returning None if nothing's left."""
+    left = max(rect[0], 0)
+    top = max(rect[1], 0)
+    right = min(rect[0] + rect[2], width)
+    bottom = min(rect[1] + rect[3], height)
+    if left >= right or top >= bottom:
+        return None
+    return (left, top, right - left, bottom - top)
+
+
+def rects_overlap(first, second):
+    return (first[0] < second[0] + second[2] and second[0] < first[0] + first[2]
+            and first[1] < second[1] + second[3] and second[1] < first[1] + first[3])
+
+
+def merge_rects(rects):
+    """Merges overlapping rectangles together, returning rectangles that don't overlap."""
+    merged = []
+    for rect in rects:
+        index = 0
+        while index < len(merged):
+            if rects_overlap(merged[index], rect):
+                rect = union_rect(rect, merged.pop(index))
+                index = 0
+            else:
+                index += 1
+        merged.append(rect)
+    return merged
+
+
+def changed_rects(parsed_file, previous_index, frame_index, tilesets=None):
+    """Returns the rectangles of the canvas that may differ between two frames, an empty list if they're the same.
+
+    Only the cels are compared, a layer's cel changing when it isn't the very
+    same cel in both frames. Linked cels being replaced by their source, a
+    cel linked to the other frame's doesn't count as a change. The area of a
+    changed cel in both frames is included, overlapping rectangles being
+    merged.
+    """
+    if tilesets is None:
+        tilesets = tileset_tiles(parsed_file)
+    width = parsed_file.header.width
+    height = parsed_file.header.height
+    previous_cels = frame_cels(parsed_file, previous_index)
+    cels = frame_cels(parsed_file, frame_index)
+    rects = []
+    for layer in parsed_file.layers:
+        previous_cel = previous_cels.get(layer.layer_index)
+        cel = cels.get(layer.layer_index)
+        if previous_cel is cel:
+            continue
+        for changed_cel in (previous_cel, cel):
+            if changed_cel is None:
+                continue
+            bounds = cel_bounds(changed_cel, layer, tilesets)
+            if bounds is not None:
+                bounds = clip_rect(bounds, width, height)
+            if bounds is not None:
+                rects.append(bounds)
+    return merge_rects(rects)
+
+
+def changed_region(parsed_file, previous_index, frame_index, tilesets=None):
+    """Returns the rectangle holding changed_rects(), or None if the frames are the same."""
+    region = None
+    for rect in changed_rects(parsed_file, previous_index, frame_index, tilesets):
+        region = union_rect(region, rect)
+    return region
+
+
+def _render_layers(parsed_file, layers, cels, canvas, region, lut, tilesets):
+    region_x, region_y, region_width, region_height = region
+    layer_opacity_valid = parsed_file.header.flags & 1 != 0
+    for layer in layers:
+        if not layer.flags & LAYER_VISIBLE or layer.flags & LAYER_REFERENCE:
+            continue
+        layer_opacity = layer.opacity / 255 if layer_opacity_valid else 1.0
+
+        if isinstance(layer, LayerGroupChunk):
+            # Groups are merged on their own before being blended like a layer.
+            group_canvas = require_numpy().zeros_like(canvas)
+            _render_layers(parsed_file, layer.children, cels, group_canvas, region, lut, tilesets)
+            blend(canvas, group_canvas, layer_opacity, layer.blend_mode)
+            continue
+
+        cel = cels.get(layer.layer_index)
+        if cel is None:
+            continue
+        bounds = cel_bounds(cel, layer, tilesets)
+        if bounds is None:
+            continue
+        # Intersect the cel with the rendered region
+        left = max(cel.x_pos, region_x)
+        top = max(cel.y_pos, region_y)
+        right = min(cel.x_pos + bounds[2], region_x + region_width)
+        bottom = min(cel.y_pos + bounds[3], region_y + region_height)
+        if left >= right or top >= bottom:
+            continue
+        if cel.cel_type == 3:
+            pixels = tilemap_pixels(cel, tilesets[layer.tileset_index], (left - cel.x_pos, top - cel.y_pos, right - left, bottom - top))
+        else:
+            pixels = cel.to_numpy(parsed_file.header.color_depth)
+            pixels = pixels[top - cel.y_pos:bottom - cel.y_pos, left - cel.x_pos:right - cel.x_pos]
+        source = pixels_to_rgba(parsed_file, pixels, layer, lut)
+        target = canvas[top - region_y:bottom - region_y, left - region_x:right - region_x]
+        blend(target, source, layer_opacity * cel.opacity / 255, layer.blend_mode)
+
+
+def _render_region(parsed_file, cels, region, lut, tilesets):
+    np = require_numpy()
+    canvas = np.zeros((region[3], region[2], 4), dtype=np.float32)
+    _render_layers(parsed_file, parsed_file.layer_tree, cels, canvas, region, lut, tilesets)
+    return np.round(canvas * 255).astype(np.uint8)
+
+
+def render_frame(parsed_file, frame_index, region=None):
+    """Flattens the visible layers of a frame into a (height, width, 4) uint8 RGBA array.
+
+    Layers are merged bottom to top, groups being merged locally before being
+    blended with their own blend mode and opacity. Tilemaps are laid out from
+    their tileset. Indexed sprites are converted through their palette.
+    region restricts the rendering to a (x, y, width, height) rectangle of
+    the canvas. Requires NumPy.
+    """
+    if region is None:
+        region = (0, 0, parsed_file.header.width, parsed_file.header.height)
+    lut = palette_lut(parsed_file) if parsed_file.header.color_depth == 8 else None
+    cels = frame_cels(parsed_file, frame_index)
+    return _render_region(parsed_file, cels, region, lut, tileset_tiles(parsed_file))
+
+
+class IncrementalRenderer(object):
+    """Renders frames one after another, recompositing only what changed since the last one.
+
+    canvas holds the last rendered frame, as a (height, width, 4) uint8 RGBA
+    array updated in place. The changed areas are found from the cels by
+    changed_rects(), so going from a frame to another one made of linked
+    cels costs nothing. Requires NumPy.
+    """
+
+    def __init__(self, parsed_file):
+        self.parsed_file = parsed_file
+        self.canvas = None
+        # Index of the frame in canvas
+        self.frame_index = None
+        self.lut = palette_lut(parsed_file) if parsed_file.header.color_depth == 8 else None
+        self.tilesets = tileset_tiles(parsed_file)
+
+    def changed_rects(self, frame_index):
+        """Returns the rectangles render() would recomposite to go to that frame."""
+        if self.canvas is None:
+            return [(0, 0, self.parsed_file.header.width, self.parsed_file.header.height)]
+        return changed_rects(self.parsed_file, self.frame_index, frame_index, self.tilesets)
+
+    def render(self, frame_index, rects=None):
+        """Updates canvas to a frame, returning (canvas, rects), rects being the recomposited rectangles.
+
+        rects can be given if already known from changed_rects().
+        """
+        np = require_numpy()
+        if rects is None:
+            rects = self.changed_rects(frame_index)
+        if self.canvas is None:
+            self.canvas = np.zeros((self.parsed_file.header.height, self.parsed_file.header.width, 4), dtype=np.uint8)
+        cels = frame_cels(self.parsed_file, frame_index)
+        for (x, y, width, height) in rects:
+            self.canvas[y:y + height, x:x + width] = _render_region(self.parsed_file, cels, (x, y, width, height), self.lut, self.tilesets)
+        self.frame_index = frame_index
+        return (self.canvas, rects)
+
+    def play(self, frame_indices=None):
+        """Yields (frame index, canvas, rects) for each frame, see render()."""
+        if frame_indices is None:
+            frame_indices = range(self.parsed_file.header.num_frames)
+        for frame_index in frame_indices:
+            (canvas, rects) = self.render(frame_index)
+            yield (frame_index, canvas, rects)
@@ -0,0 +1,72 @@
+from .headers import Header, Frame
+from .chunks import CelChunk
+from .parser import ParseContext, ParseStats, parse_frame
+
+
+def read_exactly(fileobj, size):
+    """Reads size bytes from a file-like object, or raises ValueError if it ends before."""
+    data = fileobj.read(size)
+    if len(data) == size:
+        return data
+    data = bytearray(data)
+    while len(data) < size:
+        read_data = fileobj.read(size - len(data))
+        if not read_data:
+            raise ValueError('Unexpected end of file, expected {} more bytes'.format(size - len(data)))
+        data += read_data
+    return bytes(data)
+
+
+class StreamReader(object):
+    """Parses a file from a file-like object one frame at a time.
+
+    The header is read on construction, then iterating yields the frames as
+    soon as their bytes are read, without needing to read the rest of the
+    file first. Only the frame being parsed is held in memory.
+
+    With resolve_links set, the cels of the previous frames are kept to
+    resolve linked cels, which makes memory grow with the file again.
+    stats is the ParseStats of the frames read so far.
+    """
+
+    def __init__(self, fileobj, lazy=False, decode_workers=None, resolve_links=False):
+        self.fileobj = fileobj
+        self.header = Header(read_exactly(fileobj, Header.header_size))
+        self.stats = ParseStats()
+        self.context = ParseContext(lazy, color_depth=self.header.color_depth, decode_workers=decode_workers, stats=self.stats)
+        self.resolve_links = resolve_links
+        # (layer index, frame index) -> cel, only filled if resolve_links is set
+        self.cels = {}
+        self.frame_index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.frame_index >= self.header.num_frames:
+            raise StopIteration
+        frame_header = read_exactly(self.fileobj, Frame.frame_size)
+        frame_size = Frame(frame_header).size
+        frame_data = bytearray(frame_header)
+        frame_data += read_exactly(self.fileobj, frame_size - Frame.frame_size)
+
+        frame = parse_frame(memoryview(frame_data), 0, self.context)
+        self.context.decompress_pending()
+        if self.resolve_links:
+            for chunk in frame.chunks:
+                if isinstance(chunk, CelChunk):
+                    self.cels[(chunk.layer_index, self.frame_index)] = chunk
+                    if chunk.cel_type == 1:
+                        source = self.cels.get((chunk.layer_index, chunk.data['link']))
+                        if source is not None:
+                            chunk.resolve_link(source)
+        self.frame_index += 1
+        return frame
+
+
+def iter_frames(fileobj, lazy=False, decode_workers=None, resolve_links=False):
+    """Yields the frames of a file read from a file-like object, one at a time.
+
+    See StreamReader, which also gives access to the file's header.
+    """
+    return iter(StreamReader(fileobj, lazy, decode_workers, resolve_links))
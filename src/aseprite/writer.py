@@ -0,0 +1,352 @@
+import logging
+import zlib
+from struct import Struct
+
+from .headers import Header, Frame
+from .chunks import (
+    Chunk,
+    OldPaleteChunk_0x0004,
+    OldPaleteChunk_0x0011,
+    LayerChunk,
+    CelChunk,
+    CelExtraChunk,
+    ColorProfileChunk,
+    ExternalFilesChunk,
+    MaskChunk,
+    FrameTagsChunk,
+    PathChunk,
+    PaletteChunk,
+    UserDataChunk,
+    SliceChunk,
+    TilesetChunk,
+    uint16_struct,
+    uint32_struct
+)
+
+logger = logging.getLogger(__name__)
+
+# Frame header with both chunk counts: the old 16-bit one and the 32-bit one
+# stored in what Frame.frame_format skips.
+frame_write_struct = Struct('<IHHH2xI')
+
+
+class WriteContext(object):
+    """Writing options shared by the chunk writers of a file, and what they did."""
+
+    def __init__(self, compress_level=6):
+        # zlib level of the data that has to be compressed again
+        self.compress_level = compress_level
+        # Payloads copied as they were read, and payloads compressed
+        self.reused = 0
+        self.compressed = 0
+
+    def compress(self, data):
+        self.compressed += 1
+        return zlib.compress(data, self.compress_level)
+
+    def reuse(self, payload):
+        self.reused += 1
+        return payload
+
+
+def string_bytes(string):
+    encoded = string.encode('utf-8')
+    return uint16_struct.pack(len(encoded)) + encoded
+
+
+# Chunk type -> writer(chunk, context), returning the chunk's data without its header
+chunk_writers = {}
+
+
+def register_chunk_writer(chunk_id, writer):
+    """Registers the writer serializing the chunks of type chunk_id.
+
+    The writer is called as writer(chunk, context) and returns the chunk's
+    data, the 6-byte chunk header excluded. A writer registered for an
+    already supported chunk type replaces the built-in one.
+    """
+    chunk_writers[chunk_id] = writer
+
+
+def write_old_palette(chunk, context):
+    parts = [uint16_struct.pack(len(chunk.packets))]
+    for packet in chunk.packets:
+        # 0 means 256 colors
+        parts.append(chunk.packet_struct.pack(packet.previous_packet_skip, len(packet.colors) & 0xFF))
+        for color in packet.colors:
+            parts.append(chunk.color_packet_struct.pack(*color))
+    return b''.join(parts)
+
+
+def write_layer(chunk, context):
+    parts = [
+        LayerChunk.layer_struct.pack(
+            chunk.flags,
+            chunk.layer_type,
+            chunk.layer_child_level,
+            chunk.default_width,
+            chunk.default_height,
+            chunk.blend_mode,
+            chunk.opacity
+        ),
+        string_bytes(chunk.name)
+    ]
+    if chunk.layer_type == 2:
+        parts.append(LayerChunk.layer_tileset_index_struct.pack(chunk.tileset_index))
+    return b''.join(parts)
+
+
+def write_cel(chunk, context):
+    parts = [CelChunk.cel_struct.pack(chunk.layer_index, chunk.x_pos, chunk.y_pos, chunk.opacity, chunk.cel_type)]
+    # Own properties only, a resolved linked cel would see its source's.
+    properties = dict.copy(chunk.data)
+    if chunk.cel_type == 1:
+        parts.append(uint16_struct.pack(properties['link']))
+        return b''.join(parts)
+    if chunk.cel_type == 0:
+        parts.append(CelChunk.cel_type_struct.pack(properties['width'], properties['height']))
+    elif chunk.cel_type == 2:
+        parts.append(CelChunk.cel_compressed_image_struct.pack(properties['width'], properties['height']))
+    elif chunk.cel_type == 3:
+        parts.append(CelChunk.cel_tilemap_struct.pack(
+            properties['width'],
+            properties['height'],
+            properties['bits_per_tile'],
+            properties['tile_id_bitmask'],
+            properties['flip_x_bitmask'],
+            properties['flip_y_bitmask'],
+            properties['flip_diagonal_bitmask']
+        ))
+    else:
+        raise ValueError('Cannot write cel type 0x{:04x}, its data was skipped'.format(chunk.cel_type))
+
+    if chunk.source is not None:
+        parts.append(context.reuse(chunk.payload()))
+    elif chunk.cel_type == 0:
+        parts.append(chunk.get_data())
+    else:
+        parts.append(context.compress(chunk.get_data()))
+    return b''.join(parts)
+
+
+def write_cel_extra(chunk, context):
+    return CelExtraChunk.celextra_struct.pack(
+        chunk.flags,
+        chunk.precise_x_pos,
+        chunk.precise_y_pos,
+        chunk.cel_width,
+        chunk.cel_height
+    )
+
+
+def write_color_profile(chunk, context):
+    data = ColorProfileChunk.color_profile_struct.pack(chunk.use_color_profile, chunk.use_fixed_gamma, chunk.fixed_gamma)
+    if chunk.use_color_profile == 2:
+        data += ColorProfileChunk.icc_profile_struct.pack(len(chunk.icc_profile_data)) + bytes(chunk.icc_profile_data)
+    return data
+
+
+def write_external_files(chunk, context):
+    parts = [ExternalFilesChunk.external_files_struct.pack(len(chunk.entries))]
+    for entry in chunk.entries:
+        parts.append(ExternalFilesChunk.external_file_struct.pack(entry.id, entry.type))
+        parts.append(string_bytes(entry.name))
+    return b''.join(parts)
+
+
+def write_mask(chunk, context):
+    return (
+        MaskChunk.mask_struct.pack(chunk.x_pos, chunk.y_pos, chunk.width, chunk.height)
+        + string_bytes(chunk.name)
+        + bytes(chunk.bitmap)
+    )
+
+
+def write_path(chunk, context):
+    return b''
+
+
+def write_frame_tags(chunk, context):
+    parts = [FrameTagsChunk.frametag_head_struct.pack(len(chunk.tags))]
+    for tag in chunk.tags:
+        parts.append(FrameTagsChunk.frametag_struct.pack(tag.from_frame, tag.to_frame, tag.loop, *tag.color))
+        parts.append(string_bytes(tag.name))
+    return b''.join(parts)
+
+
+def write_palette(chunk, context):
+    num_colors = len(chunk.rgba) // 4
+    parts = [PaletteChunk.palette_struct.pack(
+        chunk.palette_size,
+        chunk.first_color_index,
+        chunk.first_color_index + num_colors - 1
+    )]
+    color_struct = PaletteChunk.palette_color_struct
+    for index in range(num_colors):
+        name = chunk.names.get(chunk.first_color_index + index)
+        parts.append(color_struct.pack(1 if name is not None else 0, *chunk.rgba[index * 4:index * 4 + 4]))
+        if name is not None:
+            parts.append(string_bytes(name))
+    return b''.join(parts)
+
+
+def write_user_data(chunk, context):
+    if chunk.flags & 4 != 0:
+        logger.info('User data property maps are not supported yet, not written')
+    flags = chunk.flags & 3
+    parts = [uint32_struct.pack(flags)]
+    if flags & 1 != 0:
+        parts.append(string_bytes(chunk.string))
+    if flags & 2 != 0:
+        parts.append(UserDataChunk.userdata_color_struct.pack(chunk.red, chunk.green, chunk.blue, chunk.alpha))
+    return b''.join(parts)
+
+
+def write_slice(chunk, context):
+    parts = [SliceChunk.slice_chunk_struct.pack(len(chunk.slices), chunk.flags, chunk.reserved), string_bytes(chunk.name)]
+    for key in chunk.slices:
+        parts.append(SliceChunk.slice_struct.pack(key.start_frame, key.x, key.y, key.width, key.height))
+        if chunk.flags & 1 != 0:
+            parts.append(SliceChunk.slice_center_struct.pack(*key.center))
+        if chunk.flags & 2 != 0:
+            parts.append(SliceChunk.slice_pivot_struct.pack(*key.pivot))
+    return b''.join(parts)
+
+
+def write_tileset(chunk, context):
+    if chunk.compressed_data is not None:
+        compressed_data = context.reuse(chunk.compressed_data)
+    elif chunk.decompressed_data is not None:
+        compressed_data = context.compress(chunk.decompressed_data)
+    else:
+        compressed_data = None
+    flags = chunk.tileset_flags | 2 if compressed_data is not None else chunk.tileset_flags & ~2
+    parts = [
+        TilesetChunk.tileset_chunk_struct.pack(
+            chunk.tileset_id,
+            flags,
+            chunk.num_tiles,
+            chunk.tile_width,
+            chunk.tile_height,
+            chunk.base_index
+        ),
+        string_bytes(chunk.layer_name)
+    ]
+    if flags & 1 != 0:
+        parts.append(TilesetChunk.tileset_chunk_external_id_struct.pack(chunk.external_file_id, chunk.external_tileset_id))
+    if compressed_data is not None:
+        parts.append(TilesetChunk.tileset_chunk_compressed_tiles_struct.pack(len(compressed_data)))
+        parts.append(compressed_data)
+    return b''.join(parts)
+
+
+for chunk_class in (OldPaleteChunk_0x0004, OldPaleteChunk_0x0011):
+    register_chunk_writer(chunk_class.chunk_id, write_old_palette)
+register_chunk_writer(LayerChunk.chunk_id, write_layer)
+register_chunk_writer(CelChunk.chunk_id, write_cel)
+register_chunk_writer(CelExtraChunk.chunk_id, write_cel_extra)
+register_chunk_writer(ColorProfileChunk.chunk_id, write_color_profile)
+register_chunk_writer(ExternalFilesChunk.chunk_id, write_external_files)
+register_chunk_writer(MaskChunk.chunk_id, write_mask)
+register_chunk_writer(PathChunk.chunk_id, write_path)
+register_chunk_writer(FrameTagsChunk.chunk_id, write_frame_tags)
+register_chunk_writer(PaletteChunk.chunk_id, write_palette)
+register_chunk_writer(UserDataChunk.chunk_id, write_user_data)
+register_chunk_writer(SliceChunk.chunk_id, write_slice)
+register_chunk_writer(TilesetChunk.chunk_id, write_tileset)
+
+
+def chunk_bytes(chunk, context):
+    """Serializes a chunk, its header included."""
+    writer = chunk_writers.get(chunk.chunk_id)
+    if writer is None:
+        raise ValueError('No writer registered for chunk type 0x{:04x}'.format(chunk.chunk_id))
+    data = writer(chunk, context)
+    return Chunk.chunk_struct.pack(Chunk.chunk_struct.size + len(data), chunk.chunk_id) + data
+
+
+def frame_bytes(frame, context):
+    """Serializes a frame and its chunks."""
+    data = b''.join(chunk_bytes(chunk, context) for chunk in frame.chunks)
+    num_chunks = len(frame.chunks)
+    return frame_write_struct.pack(
+        Frame.frame_size + len(data),
+        0xF1FA,
+        min(num_chunks, 0xFFFF),
+        frame.frame_duration,
+        num_chunks
+    ) + data
+
+
+def header_bytes(header, file_size, num_frames):
+    return Header.header_struct.pack(
+        file_size,
+        0xA5E0,
+        num_frames,
+        header.width,
+        header.height,
+        header.color_depth,
+        header.flags,
+        header.speed_deprecated,
+        header.palette_mask,
+        header.num_colors,
+        header.pixel_width,
+        header.pixel_height,
+        header.grid_x_position,
+        header.grid_y_position,
+        header.grid_width,
+        header.grid_height
+    )
+
+
+def check_layer_indices(parsed_file):
+    """Raises ValueError if writing the file would change which layer a layer index designates.
+
+    The parser skips layers of unsupported types but still counts them, and
+    reading a written file counts the layer chunks again: the layers after a
+    skipped one, and their cels, would move down an index.
+    """
+    num_layers = 0
+    last_cel_layer = -1
+    for frame_index in range(len(parsed_file.frames)):
+        for chunk in parsed_file.frame(frame_index).chunks:
+            if isinstance(chunk, LayerChunk):
+                if chunk.layer_index != num_layers:
+                    raise ValueError('Cannot write layer {} ({!r}) as layer {}, a layer of unsupported type was skipped '
+                                     'while parsing'.format(chunk.layer_index, chunk.name, num_layers))
+                num_layers += 1
+            elif isinstance(chunk, CelChunk):
+                last_cel_layer = max(last_cel_layer, chunk.layer_index)
+    if last_cel_layer >= num_layers:
+        raise ValueError('Cannot write the cels of layer {}, a layer of unsupported type skipped while '
+                         'parsing'.format(last_cel_layer))
+
+
+def file_bytes(parsed_file, compress_level=6, context=None):
+    """Serializes a parsed file back to the .aseprite format.
+
+    Everything the parser keeps is written from the parsed objects: chunks
+    can be edited, added or removed from the frames beforehand. Cel and
+    tileset payloads are copied from the source file as they are, unless
+    replaced with replace_data(), in which case they're compressed at
+    compress_level. Skipped chunks, property maps and the fields the parser
+    doesn't read aren't written. Files with skipped layers can't be written,
+    see check_layer_indices(). context, a WriteContext, overrides
+    compress_level and records how many payloads were reused and compressed.
+    """
+    check_layer_indices(parsed_file)
+    if context is None:
+        context = WriteContext(compress_level)
+    frames = [frame_bytes(parsed_file.frame(frame_index), context) for frame_index in range(len(parsed_file.frames))]
+    file_size = Header.header_size + sum(len(frame) for frame in frames)
+    return header_bytes(parsed_file.header, file_size, len(frames)) + b''.join(frames)
+
+
+def write_file(parsed_file, path, compress_level=6, context=None):
+    """Writes a parsed file to path (or a binary file object), see file_bytes()."""
+    data = file_bytes(parsed_file, compress_level, context)
+    if hasattr(path, 'write'):
+        path.write(data)
+        return
+    with open(path, 'wb') as f:
+        f.write(data)
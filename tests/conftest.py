@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(root, 'src'))
+# synthetic.py generates the files the tests parse
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.writer import file_bytes
+
+
+@pytest.fixture(params=[32, 8])
+def skipped_layer_file(request):
+    """Returns a file whose first layer has an unsupported type, and the same file with a normal first layer.
+
+    The parser skips that layer but still counts it: the other layers keep
+    their indices, not their positions in parsed_file.layers.
+    """
+    data = synthetic.generate(num_layers=2, color_depth=request.param, groups=False)
+    parsed_file = AsepriteFile(data)
+    parsed_file.layers[0].layer_type = 3
+    skipped_file = AsepriteFile(file_bytes(parsed_file))
+    assert [layer.layer_index for layer in skipped_file.layers] == [1, 2]
+    return (skipped_file, AsepriteFile(data))
+
+
+@pytest.fixture
+def dangling_link_file():
+    """Returns a file whose frame 1 links layer 1's cel to a frame 0 cel that doesn't exist."""
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=2, groups=False))
+    parsed_file.frames[0].chunks.remove(parsed_file.get_cel(1, 0))
+    parsed_file = AsepriteFile(file_bytes(parsed_file))
+    cel = parsed_file.get_cel(1, 1)
+    assert cel.cel_type == 1 and cel.link_source is None
+    return parsed_file
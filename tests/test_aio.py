@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import synthetic
+from aseprite import AsepriteFile, aio
+from aseprite.chunks import CelChunk
+
+
+class ConcurrencyProbe(object):
+    """A blocking job recording how many copies of it run at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, value):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return value
+
+
+def test_job_limiter_bounds_concurrency():
+    limiter = aio.JobLimiter(2)
+    probe = ConcurrencyProbe()
+
+    async def main():
+        with ThreadPoolExecutor(8) as executor:
+            return await asyncio.gather(*(limiter.run(executor, probe, value) for value in range(8)))
+
+    assert asyncio.run(main()) == list(range(8))
+    assert probe.max_running == 2
+    # Another event loop gets its own semaphore
+    probe.max_running = 0
+    assert asyncio.run(main()) == list(range(8))
+    assert probe.max_running == 2
+
+
+def test_set_max_jobs(monkeypatch):
+    monkeypatch.setattr(aio, 'limiter', aio.limiter)
+    aio.set_max_jobs(1)
+    probe = ConcurrencyProbe()
+
+    async def main():
+        with ThreadPoolExecutor(4) as executor:
+            await asyncio.gather(*(aio.limiter.run(executor, probe, value) for value in range(4)))
+
+    asyncio.run(main())
+    assert probe.max_running == 1
+
+
+@pytest.fixture
+def sample_path(tmp_path):
+    path = tmp_path / 'sample.aseprite'
+    path.write_bytes(synthetic.generate())
+    return str(path)
+
+
+def cel_values(frame):
+    return [(chunk.layer_index, chunk.cel_type, chunk.x_pos, chunk.y_pos)
+            for chunk in frame.chunks if isinstance(chunk, CelChunk)]
+
+
+def test_load(sample_path):
+    parsed_file = asyncio.run(aio.load(sample_path))
+    expected = AsepriteFile.open(sample_path)
+    assert parsed_file.header.num_frames == expected.header.num_frames
+    for frame_index in range(expected.header.num_frames):
+        assert parsed_file.frames[frame_index] is not None
+        assert cel_values(parsed_file.frames[frame_index]) == cel_values(expected.frame(frame_index))
+    for key, cel in expected.cels.items():
+        assert bytes(parsed_file.cels[key].get_data()) == bytes(cel.get_data())
+    expected.close()
+
+
+def test_iter_frames(sample_path):
+    async def main():
+        return [frame async for frame in aio.iter_frames(sample_path)]
+
+    frames = asyncio.run(main())
+    expected = AsepriteFile.open(sample_path)
+    assert [cel_values(frame) for frame in frames] == [cel_values(frame) for frame in expected.frames]
+    expected.close()
+
+
+def test_play_matches_render_frame(sample_path):
+    pytest.importorskip('numpy')
+    parsed_file = AsepriteFile.open(sample_path)
+    frame_indices = [0, 1, 2, 3, 1]
+
+    async def main():
+        rendered = [(frame_index, canvas.copy()) async for frame_index, canvas, _ in aio.play(parsed_file, frame_indices)]
+        single = await aio.render_frame(parsed_file, 2)
+        return (rendered, single)
+
+    (rendered, single) = asyncio.run(main())
+    assert [frame_index for frame_index, _ in rendered] == frame_indices
+    for frame_index, canvas in rendered:
+        assert (canvas == parsed_file.render_frame(frame_index)).all()
+    assert (single == parsed_file.render_frame(2)).all()
+    parsed_file.close()
@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.atlas import build_atlas
+from aseprite.writer import file_bytes
+
+
+def moving_sprite_file():
+    """Two frames showing the same 8x8 sprite, opaque in its 4x4 center, at x=2 then x=10."""
+    parsed_file = AsepriteFile(synthetic.generate(
+        num_frames=2, num_layers=1, groups=False, tilemap=False, linked=False, num_slices=0, num_tags=0))
+    sprite = np.zeros((8, 8, 4), dtype=np.uint8)
+    sprite[2:6, 2:6] = (200, 100, 50, 255)
+    for frame_index, x in ((0, 2), (1, 10)):
+        cel = parsed_file.get_cel(0, frame_index)
+        cel.replace_data(sprite.tobytes())
+        cel.data['width'] = 8
+        cel.data['height'] = 8
+        (cel.x_pos, cel.y_pos, cel.opacity) = (x, 3, 255)
+    return AsepriteFile(file_bytes(parsed_file))
+
+
+def test_moving_sprite_keeps_its_offsets():
+    atlas = build_atlas({'sprite': moving_sprite_file()})
+    (first, second) = atlas.frames
+    # Packed once...
+    assert (first.page, first.x, first.y) == (second.page, second.x, second.y)
+    assert (first.width, first.height) == (second.width, second.height) == (4, 4)
+    # ...but trimmed from where each frame shows it
+    assert (first.offset_x, first.offset_y) == (4, 5)
+    assert (second.offset_x, second.offset_y) == (12, 5)
+    assert (first.source_width, first.source_height) == (64, 64)
+
+
+def test_frames_match_renders():
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=4))
+    atlas = build_atlas({'sprite': parsed_file}, padding=2)
+    for frame in atlas.frames:
+        expected = parsed_file.render_frame(frame.frame_index)
+        image = np.zeros_like(expected)
+        image[frame.offset_y:frame.offset_y + frame.height, frame.offset_x:frame.offset_x + frame.width] = \
+            atlas.pages[frame.page][frame.y:frame.y + frame.height, frame.x:frame.x + frame.width]
+        assert (image == expected).all()
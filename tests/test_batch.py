@@ -0,0 +1,37 @@
+import pytest
+
+import synthetic
+from aseprite.batch import load_many
+
+
+def project_size(parsed_file):
+    return (parsed_file.header.width, parsed_file.header.height)
+
+
+@pytest.fixture
+def batch_paths(tmp_path):
+    """Returns two valid files, a missing one and a truncated one."""
+    paths = []
+    for name, data in (('a', synthetic.generate(width=32)), ('b', synthetic.generate(height=16))):
+        path = tmp_path / (name + '.aseprite')
+        path.write_bytes(data)
+        paths.append(str(path))
+    paths.append(str(tmp_path / 'missing.aseprite'))
+    truncated = tmp_path / 'truncated.aseprite'
+    truncated.write_bytes(synthetic.generate()[:200])
+    paths.append(str(truncated))
+    return paths
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_errors_are_reported_per_file(batch_paths, workers):
+    results = sorted(load_many(batch_paths, workers, project_size), key=lambda result: result.index)
+    assert [result.path for result in results] == batch_paths
+    assert [result.ok for result in results] == [True, True, False, False]
+    assert [result.value for result in results] == [(32, 64), (64, 16), None, None]
+    assert results[2].error.startswith('FileNotFoundError')
+
+
+def test_named_projection(batch_paths):
+    results = sorted(load_many(batch_paths[:2], 2, 'tags'), key=lambda result: result.index)
+    assert [[tag.name for tag in result.value] for result in results] == [['Tag 0', 'Tag 1']] * 2
@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from aseprite.bounds import AlphaIndex
+
+
+def test_alpha_after_a_skipped_layer(skipped_layer_file):
+    (parsed_file, reference_file) = skipped_layer_file
+    index = AlphaIndex(parsed_file)
+    expected = AlphaIndex(reference_file)
+    for frame_index in range(len(parsed_file.frames)):
+        assert index.cel_alpha(0, frame_index) is None
+        # The tilemap layer's tileset and the indexed layers' background flag
+        for layer_index in (1, 2):
+            alpha = index.cel_alpha(layer_index, frame_index, True)
+            reference = expected.cel_alpha(layer_index, frame_index, True)
+            assert (alpha is None) == (reference is None)
+            if alpha is not None:
+                assert alpha[:4] == reference[:4]
+                assert np.array_equal(alpha.mask, reference.mask)
+
+    # Columns stay indexed by layer index
+    xs = np.arange(64)
+    opaque = index.opaque_at(0, xs, xs)
+    assert opaque.shape == (64, 3)
+    assert not opaque[:, 0].any()
+    assert np.array_equal(opaque[:, 1:], expected.opaque_at(0, xs, xs)[:, 1:])
+
+
+def test_dangling_link_has_no_alpha(dangling_link_file):
+    index = AlphaIndex(dangling_link_file)
+    assert index.cel_alpha(1, 1) is None
+    layer_indices = [layer_index for layer_index, _ in index.frame_alpha(1)]
+    assert 1 not in layer_indices
+    assert layer_indices == [layer_index for layer_index, _ in index.frame_alpha(0)]
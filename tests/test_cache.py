@@ -0,0 +1,56 @@
+import os
+import stat
+
+import synthetic
+from aseprite.cache import AssetCache
+from aseprite.chunks import CelChunk
+from aseprite.writer import file_bytes
+
+
+def cached_sample(tmp_path):
+    data = synthetic.generate()
+    path = str(tmp_path / 'sample.aseprite')
+    with open(path, 'wb') as f:
+        f.write(data)
+    cache = AssetCache(str(tmp_path / 'cache'))
+    cache.open(path).close()
+    return (cache, path, data)
+
+
+def test_warm_load(tmp_path):
+    (cache, path, data) = cached_sample(tmp_path)
+    with cache.open(path) as parsed_file:
+        assert parsed_file.mapping is not None
+        assert file_bytes(parsed_file) != b''
+        assert parsed_file.header.num_frames == 4
+
+
+def test_entries_use_the_default_mode(tmp_path):
+    (cache, path, data) = cached_sample(tmp_path)
+    # Created like any file, under the umask
+    reference = tmp_path / 'reference'
+    reference.write_bytes(b'')
+    for _, _, entry_path in cache.entries():
+        assert stat.S_IMODE(os.stat(entry_path).st_mode) == stat.S_IMODE(os.stat(reference).st_mode)
+
+
+def test_truncated_entry_is_removed(tmp_path):
+    (cache, path, data) = cached_sample(tmp_path)
+    [(_, size, entry_path)] = cache.entries()
+    # Cuts the pickle's end: loading fails once the buffers are handed out.
+    with open(entry_path, 'r+b') as f:
+        f.truncate(size - 1)
+    assert cache.get(AssetCache.key(data)) is None
+    assert not os.path.exists(entry_path)
+
+
+def test_failed_load_releases_the_mapping(tmp_path, monkeypatch):
+    (cache, path, data) = cached_sample(tmp_path)
+
+    def failing_setstate(self, state):
+        # The traceback keeps this frame, and the views in state, alive.
+        raise ValueError('Unreadable cel')
+
+    monkeypatch.setattr(CelChunk, '__setstate__', failing_setstate)
+    assert cache.get(AssetCache.key(data)) is None
+    assert cache.entries() == []
@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from aseprite.convert import convert_frame
+
+
+def converted_cels(parsed_file, frame_index):
+    """Returns the converted bytes of a frame's cels by layer index."""
+    (out, cels) = convert_frame(parsed_file, frame_index, 'bgra')
+    return {converted.layer_index: out[converted.offset:converted.offset + converted.stride * converted.height]
+            for converted in cels}
+
+
+def test_convert_frame_after_a_skipped_layer(skipped_layer_file):
+    (parsed_file, reference_file) = skipped_layer_file
+    for frame_index in range(len(parsed_file.frames)):
+        cels = converted_cels(parsed_file, frame_index)
+        expected = converted_cels(reference_file, frame_index)
+        # Layer 0's cels are still there, without their layer
+        assert cels.keys() == expected.keys()
+        for layer_index in (1, 2):
+            assert cels[layer_index] == expected[layer_index]
+
+
+def test_dangling_link_is_skipped(dangling_link_file):
+    cels = converted_cels(dangling_link_file, 1)
+    assert 1 not in cels
+    assert cels.keys() == converted_cels(dangling_link_file, 0).keys()
@@ -0,0 +1,37 @@
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.dedup import deduplicate
+
+
+def test_shared_cels_of_mapped_files(tmp_path):
+    data = synthetic.generate(raw_cels=True)
+    paths = []
+    for name in ('a', 'b'):
+        path = tmp_path / (name + '.aseprite')
+        path.write_bytes(data)
+        paths.append(str(path))
+    files = {path: AsepriteFile.open(path) for path in paths}
+    expected = {key: bytes(cel.get_data()) for key, cel in files[paths[0]].cels.items() if cel.cel_type == 0}
+
+    index = deduplicate(files)
+    assert index.decoded_hits == len(expected)
+    for path in paths:
+        for key in expected:
+            assert files[path].cels[key].get_data() is files[paths[0]].cels[key].get_data()
+
+    # No buffer may still view a mapping
+    for parsed_file in files.values():
+        parsed_file.close()
+    for parsed_file in files.values():
+        assert parsed_file.mapping is None
+        for key, cel_data in expected.items():
+            assert bytes(parsed_file.cels[key].get_data()) == cel_data
+
+
+def test_compressed_payloads_are_not_decompressed_twice():
+    data = synthetic.generate()
+    files = {name: AsepriteFile(data, lazy=True) for name in ('a', 'b')}
+    index = deduplicate(files)
+    cels = [cel for cel in files['a'].cels.values() if cel.cel_type in (2, 3)]
+    assert index.compressed_hits == len(cels) + len(index.tilesets) // 2
+    assert all(files['b'].cels[key].get_data() is cel.get_data() for key, cel in files['a'].cels.items())
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.export import apng_bytes, gif_bytes, tag_frames
+
+
+def expected_frames(parsed_file, frame_indices):
+    """Returns the [render, duration] of the frames, identical consecutive ones being merged."""
+    frames = []
+    for frame_index in frame_indices:
+        canvas = parsed_file.render_frame(frame_index)
+        duration = parsed_file.frame(frame_index).frame_duration
+        if frames and np.array_equal(frames[-1][0], canvas):
+            frames[-1][1] += duration
+        else:
+            frames.append([canvas, duration])
+    return frames
+
+
+def decoded_frames(data):
+    """Returns the (RGBA pixels, duration) of an animation's frames, decoded with Pillow."""
+    Image = pytest.importorskip('PIL.Image')
+    image = Image.open(io.BytesIO(data))
+    frames = []
+    for frame_number in range(getattr(image, 'n_frames', 1)):
+        image.seek(frame_number)
+        frames.append((np.asarray(image.convert('RGBA')), image.info['duration']))
+    return frames
+
+
+def test_tag_frames():
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=12, num_tags=4))
+    # The synthetic tags play forward, reverse, ping-pong and ping-pong reverse
+    assert tag_frames(parsed_file, 'Tag 0') == [0, 1, 2]
+    assert tag_frames(parsed_file, 'Tag 1') == [5, 4, 3]
+    assert tag_frames(parsed_file, 'Tag 2') == [6, 7, 8, 7]
+    assert tag_frames(parsed_file, 'Tag 3') == [11, 10, 9, 10]
+    with pytest.raises(KeyError):
+        tag_frames(parsed_file, 'Missing')
+
+
+@pytest.mark.parametrize('export', [apng_bytes, gif_bytes])
+def test_no_frames(export):
+    parsed_file = AsepriteFile(synthetic.generate())
+    with pytest.raises(ValueError, match='No frames'):
+        export(parsed_file, [])
+
+
+def test_apng_round_trip():
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=6))
+    frame_indices = [0, 1, 2, 3, 4, 5, 2]
+    expected = expected_frames(parsed_file, frame_indices)
+    decoded = decoded_frames(apng_bytes(parsed_file, frame_indices))
+    assert len(decoded) == len(expected)
+    for (pixels, duration), (canvas, expected_duration) in zip(decoded, expected):
+        assert np.array_equal(pixels, canvas)
+        assert duration == expected_duration
+
+
+def test_gif_round_trip():
+    # Few enough colors not to be reduced, and cels of half opacity whose
+    # pixels count as opaque
+    parsed_file = AsepriteFile(synthetic.generate(
+        num_frames=6, num_layers=1, color_depth=8, palette_size=16, groups=False, tilemap=False))
+    frame_indices = [0, 1, 2, 3, 4, 5, 2]
+    expected = expected_frames(parsed_file, frame_indices)
+    decoded = decoded_frames(gif_bytes(parsed_file, frame_indices))
+    assert len(decoded) == len(expected)
+    for (pixels, duration), (canvas, expected_duration) in zip(decoded, expected):
+        opaque = canvas[..., 3] >= 128
+        assert np.array_equal(pixels[..., 3] != 0, opaque)
+        assert np.array_equal(pixels[opaque][:, :3], canvas[opaque][:, :3])
+        assert duration == expected_duration
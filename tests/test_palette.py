@@ -0,0 +1,49 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.palette import PaletteMapper, expand_indexed, indexed_lut, palette_rgba, palette_size
+
+
+def test_expand_indexed():
+    parsed_file = AsepriteFile(synthetic.generate(color_depth=8))
+    lut = indexed_lut(parsed_file)
+    assert lut.shape == (256, 4)
+    assert not lut[parsed_file.header.palette_mask].any()
+    pixels = parsed_file.get_cel(1, 0).to_numpy(8)
+    expected = lut[pixels]
+    assert np.array_equal(expand_indexed(pixels, lut), expected)
+
+    out = np.empty(pixels.shape + (4,), dtype=np.uint8)
+    assert expand_indexed(pixels, lut, out) is out
+    assert np.array_equal(out, expected)
+
+
+def test_mapper_finds_palette_colors():
+    parsed_file = AsepriteFile(synthetic.generate(color_depth=8))
+    mapper = PaletteMapper.from_file(parsed_file)
+    colors = palette_rgba(parsed_file)
+    pixels = colors[None, 1:]
+    indices = mapper.map(pixels)
+    assert indices.dtype == np.uint8
+    # The same colors, if not always the same indices
+    assert np.array_equal(colors[indices], pixels)
+
+    # Transparent pixels map to the transparent index, memoized ones too
+    pixels = pixels.copy()
+    pixels[0, ::2, 3] = 0
+    indices = mapper.map(pixels)
+    assert (indices[0, ::2] == parsed_file.header.palette_mask).all()
+    assert parsed_file.header.palette_mask not in indices[0, 1::2]
+
+
+def test_mapper_ignores_palette_padding():
+    parsed_file = AsepriteFile(synthetic.generate(color_depth=8, palette_size=16))
+    assert palette_size(parsed_file) == 16
+    mapper = PaletteMapper.from_file(parsed_file)
+    pixels = np.array([[[0, 0, 0, 255], [1, 2, 3, 255], [255, 255, 255, 255]]], dtype=np.uint8)
+    indices = mapper.map(pixels)
+    assert (indices < 16).all()
+    assert (indices != parsed_file.header.palette_mask).all()
@@ -0,0 +1,18 @@
+import io
+
+import synthetic
+from aseprite.probe import probe
+
+
+def test_probe_from_current_position():
+    data = synthetic.generate(num_frames=4)
+    expected = probe(io.BytesIO(data))
+    fileobj = io.BytesIO(b'junk' + data)
+    fileobj.read(4)
+
+    result = probe(fileobj)
+    assert result.frame_durations == expected.frame_durations
+    assert result.layer_names == expected.layer_names
+    assert result.tag_names == expected.tag_names
+    assert result.slice_names == expected.slice_names
+    assert (len(result.frame_durations), len(result.layer_names), len(result.tag_names)) == (4, 4, 2)
@@ -0,0 +1,113 @@
+import pickle
+import random
+
+import pytest
+
+import synthetic
+from aseprite import AsepriteFile, FileIndex, IncrementalRenderer
+from aseprite.writer import WriteContext, file_bytes
+
+
+def load_eager(data, path):
+    return AsepriteFile(data)
+
+
+def load_lazy(data, path):
+    return AsepriteFile(data, lazy=True, cel_cache_size=2)
+
+
+def load_threaded(data, path):
+    return AsepriteFile(data, decode_workers=4)
+
+
+def load_on_demand(data, path):
+    return AsepriteFile(data, load_frames=False)
+
+
+def load_pickled(data, path):
+    return pickle.loads(pickle.dumps(AsepriteFile(data, lazy=True)))
+
+
+def load_indexed(data, path):
+    index_path = path + '.idx'
+    FileIndex.scan(memoryview(data)).save(index_path)
+    return AsepriteFile(data, load_frames=False, index=FileIndex.load(index_path))
+
+
+def load_mapped(data, path):
+    return AsepriteFile.open(path, lazy=True)
+
+
+loaders = [load_eager, load_lazy, load_threaded, load_on_demand, load_pickled, load_indexed, load_mapped]
+
+
+@pytest.fixture(params=sorted(synthetic.samples))
+def sample(request, tmp_path):
+    data = synthetic.generate(**synthetic.samples[request.param])
+    path = str(tmp_path / (request.param + '.aseprite'))
+    with open(path, 'wb') as f:
+        f.write(data)
+    return (data, path)
+
+
+@pytest.mark.parametrize('loader', loaders)
+def test_round_trip(sample, loader):
+    (data, path) = sample
+    parsed_file = loader(data, path)
+    context = WriteContext()
+    assert file_bytes(parsed_file, context=context) == data
+    # Nothing was modified, every payload is copied
+    assert context.compressed == 0
+    parsed_file.close()
+
+
+@pytest.mark.parametrize('loader', loaders)
+def test_renders_match(sample, loader):
+    pytest.importorskip('numpy')
+    (data, path) = sample
+    expected = AsepriteFile(data)
+    parsed_file = loader(data, path)
+    for frame_index in range(0, expected.header.num_frames, max(1, expected.header.num_frames // 8)):
+        assert (parsed_file.render_frame(frame_index) == expected.render_frame(frame_index)).all()
+    parsed_file.close()
+
+
+def test_incremental_renderer(sample):
+    pytest.importorskip('numpy')
+    (data, path) = sample
+    parsed_file = AsepriteFile(data)
+    num_frames = parsed_file.header.num_frames
+    frame_indices = list(range(num_frames)) + [random.Random(0).randrange(num_frames) for _ in range(16)]
+    renderer = IncrementalRenderer(parsed_file)
+    for frame_index, canvas, rects in renderer.play(frame_indices):
+        assert (canvas == parsed_file.render_frame(frame_index)).all()
+
+
+def test_modified_cel_is_compressed_again():
+    pytest.importorskip('numpy')
+    parsed_file = AsepriteFile(synthetic.generate(color_depth=8))
+    cel = parsed_file.get_cel(1, 0)
+    pixels = cel.to_numpy().copy()
+    pixels[pixels == 3] = 4
+    cel.replace_data(pixels.tobytes())
+    context = WriteContext(9)
+    written = AsepriteFile(file_bytes(parsed_file, context=context))
+    assert context.compressed == 1
+    assert (written.get_cel(1, 0).to_numpy() == pixels).all()
+    assert (written.render_frame(0) == parsed_file.render_frame(0)).all()
+
+
+def test_skipped_layer_is_not_written(skipped_layer_file):
+    (parsed_file, _) = skipped_layer_file
+    with pytest.raises(ValueError, match='unsupported type'):
+        file_bytes(parsed_file)
+
+
+def test_skipped_last_layer_is_not_written():
+    parsed_file = AsepriteFile(synthetic.generate(groups=False))
+    parsed_file.layers[-1].layer_type = 3
+    skipped_file = AsepriteFile(file_bytes(parsed_file))
+    # The layers keep their indices, but the last one's cels would point nowhere
+    assert len(skipped_file.layers) == len(parsed_file.layers) - 1
+    with pytest.raises(ValueError, match='unsupported type'):
+        file_bytes(skipped_file)
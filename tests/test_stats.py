@@ -0,0 +1,77 @@
+import logging
+import struct
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.chunks import CelChunk, LayerChunk, TilesetChunk
+from aseprite.writer import file_bytes
+
+unknown_chunk_type = 0x2099
+
+
+def with_unknown_chunk(data):
+    """Inserts a 10-byte chunk of an unknown type at the start of the first frame."""
+    chunk = struct.pack('<IH4x', 10, unknown_chunk_type)
+    (frame_size, magic, old_count, duration, count) = struct.unpack_from('<IHHH2xI', data, 128)
+    frame_header = struct.pack('<IHHH2xI', frame_size + len(chunk), magic, old_count + 1, duration, count + 1)
+    file_size = struct.pack('<I', len(data) + len(chunk))
+    return file_size + data[4:128] + frame_header + chunk + data[144:]
+
+
+def skipped_layer_data():
+    parsed_file = AsepriteFile(synthetic.generate(groups=False))
+    parsed_file.layers[0].layer_type = 3
+    return file_bytes(parsed_file)
+
+
+def test_skipped_chunks_are_recorded(caplog):
+    data = with_unknown_chunk(skipped_layer_data())
+    with caplog.at_level(logging.INFO, logger='aseprite'):
+        parsed_file = AsepriteFile(data)
+    (unknown, layer) = parsed_file.stats.skipped
+    assert unknown == (unknown_chunk_type, 144, 10, 'unsupported chunk type')
+    assert (layer.chunk_type, layer.reason) == (LayerChunk.chunk_id, 'rejected by its handler')
+    assert struct.unpack_from('<IH', data, layer.offset) == (layer.size, LayerChunk.chunk_id)
+    assert parsed_file.stats.chunk_types[unknown_chunk_type].count == 1
+    assert parsed_file.stats.summary().startswith('Parsed in ')
+    assert '2 chunks skipped' in parsed_file.stats.summary()
+    assert 'Skipped chunk of unsupported type 0x2099' in caplog.text
+    assert 'Skipped layer with unsupported layer type 0x0003' in caplog.text
+
+
+def test_chunk_type_totals():
+    data = synthetic.generate()
+    parsed_file = AsepriteFile(data)
+    chunk_types = parsed_file.stats.chunk_types
+    cels = list(parsed_file.cels.values())
+    assert chunk_types[CelChunk.chunk_id].count == len(cels)
+    assert chunk_types[CelChunk.chunk_id].bytes == sum(cel.chunk_size for cel in cels)
+    decoded = [cel for cel in cels if cel.cel_type != 1]
+    assert chunk_types[CelChunk.chunk_id].decompressed_bytes == sum(len(cel.get_data()) for cel in decoded)
+    [tileset] = [chunk for chunk in parsed_file.frames[0].chunks if isinstance(chunk, TilesetChunk)]
+    assert chunk_types[TilesetChunk.chunk_id].decompressed_bytes == len(tileset.tileset_image)
+    # Every byte after the header belongs to a frame header or a chunk
+    frame_headers = 16 * parsed_file.header.num_frames
+    assert sum(stats.bytes for stats in chunk_types.values()) == len(data) - 128 - frame_headers
+    assert all(stats.time >= 0 for stats in chunk_types.values())
+
+
+def test_deferred_and_on_demand_parsing():
+    data = synthetic.generate()
+    eager = AsepriteFile(data).stats.chunk_types[CelChunk.chunk_id]
+
+    threaded = AsepriteFile(data, decode_workers=2).stats
+    assert threaded.chunk_types[CelChunk.chunk_id].decompressed_bytes == eager.decompressed_bytes
+    assert threaded.decode_time > 0
+
+    # Lazy cels are decompressed after parsing
+    assert AsepriteFile(data, lazy=True).stats.chunk_types[CelChunk.chunk_id].decompressed_bytes == 0
+
+    # Frames parsed on demand add to the stats
+    on_demand = AsepriteFile(data, load_frames=False)
+    first_count = on_demand.stats.chunk_types[CelChunk.chunk_id].count
+    assert first_count < eager.count
+    for frame_index in range(on_demand.header.num_frames):
+        on_demand.frame(frame_index)
+    assert on_demand.stats.chunk_types[CelChunk.chunk_id].count == eager.count
+    assert on_demand.stats.chunk_types[CelChunk.chunk_id].decompressed_bytes == eager.decompressed_bytes
@@ -0,0 +1,64 @@
+import pytest
+
+import synthetic
+from aseprite import AsepriteFile
+from aseprite.chunks import CelChunk
+from aseprite.stream import StreamReader, iter_frames
+
+
+class Pipe(object):
+    """A non-seekable file-like object returning at most 7 bytes per read."""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, size):
+        read_data = self.data[self.position:self.position + min(size, 7)]
+        self.position += len(read_data)
+        return read_data
+
+
+def cel_values(frame):
+    return [(chunk.layer_index, chunk.cel_type, bytes(chunk.get_data() or b''))
+            for chunk in frame.chunks if isinstance(chunk, CelChunk)]
+
+
+def test_frames_match_the_parsed_file():
+    data = synthetic.generate(linked=False)
+    parsed_file = AsepriteFile(data)
+    pipe = Pipe(data)
+    reader = StreamReader(pipe)
+    assert reader.header.num_frames == 4
+    end = reader.header.header_size
+    for frame_index, frame in enumerate(reader):
+        # Yielded as soon as read, before the rest of the file
+        end += frame.size
+        assert pipe.position == end
+        expected = parsed_file.frame(frame_index)
+        assert frame.frame_duration == expected.frame_duration
+        assert [type(chunk) for chunk in frame.chunks] == [type(chunk) for chunk in expected.chunks]
+        assert cel_values(frame) == cel_values(expected)
+    assert pipe.position == len(data)
+    assert reader.stats.chunk_types[CelChunk.chunk_id].count == sum(
+        len(cel_values(parsed_file.frame(frame_index))) for frame_index in range(4))
+
+
+def test_resolve_links():
+    frames = list(iter_frames(Pipe(synthetic.generate()), resolve_links=True))
+    linked = [chunk for chunk in frames[1].chunks if isinstance(chunk, CelChunk) and chunk.cel_type == 1]
+    assert linked
+    for cel in linked:
+        assert cel.link_source is not None
+        assert cel.get_data() is cel.link_source.get_data()
+
+    frames = list(iter_frames(Pipe(synthetic.generate())))
+    linked = [chunk for chunk in frames[1].chunks if isinstance(chunk, CelChunk) and chunk.cel_type == 1]
+    assert all(cel.link_source is None for cel in linked)
+
+
+def test_truncated_stream():
+    data = synthetic.generate()
+    reader = StreamReader(Pipe(data[:-10]))
+    with pytest.raises(ValueError, match='Unexpected end of file'):
+        list(reader)
@@ -0,0 +1,86 @@
+import array
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import synthetic
+from aseprite import AsepriteFile, chunks
+from aseprite.render import tileset_tiles, tilemap_pixels
+from aseprite.writer import file_bytes
+
+# Bits per tile -> (tile id, X flip, Y flip, diagonal flip) bitmasks
+tile_bitmasks = {
+    8: (0x1f, 0x80, 0x40, 0x20),
+    16: (0x1fff, 0x8000, 0x4000, 0x2000),
+    32: (0x1fffffff, 0x80000000, 0x40000000, 0x20000000)
+}
+
+
+def tilemap_file(bits_per_tile):
+    """Returns a file whose layer 1 is an 8x8 tilemap using every flip combination, and the tile values it holds."""
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=1, num_layers=1, groups=False))
+    cel = parsed_file.get_cel(1, 0)
+    (id_mask, flip_x, flip_y, flip_diagonal) = tile_bitmasks[bits_per_tile]
+    positions = np.arange(64)
+    values = positions % 4
+    values |= np.where(positions & 1, flip_x, 0)
+    values |= np.where(positions & 2, flip_y, 0)
+    values |= np.where(positions & 4, flip_diagonal, 0)
+    values = values.astype(chunks.tile_types[bits_per_tile][0])
+    cel.replace_data(values.tobytes())
+    cel.data.update(bits_per_tile=bits_per_tile, tile_id_bitmask=id_mask, flip_x_bitmask=flip_x,
+                    flip_y_bitmask=flip_y, flip_diagonal_bitmask=flip_diagonal)
+    return (AsepriteFile(file_bytes(parsed_file)), values)
+
+
+@pytest.mark.parametrize('bits_per_tile', [8, 16, 32])
+def test_decode_tiles(bits_per_tile):
+    (parsed_file, values) = tilemap_file(bits_per_tile)
+    cel = parsed_file.get_cel(1, 0)
+    assert np.array_equal(cel.unpack_tiles(), values)
+    tiles = cel.decode_tiles()
+    positions = np.arange(64).reshape(8, 8)
+    assert np.array_equal(tiles.ids, positions % 4)
+    assert np.array_equal(tiles.flip_x, (positions & 1) != 0)
+    assert np.array_equal(tiles.flip_y, (positions & 2) != 0)
+    assert np.array_equal(tiles.flip_diagonal, (positions & 4) != 0)
+
+
+@pytest.mark.parametrize('bits_per_tile', [8, 16, 32])
+def test_unpack_tiles_without_numpy(bits_per_tile, monkeypatch):
+    (parsed_file, values) = tilemap_file(bits_per_tile)
+    monkeypatch.setattr(chunks, 'numpy', None)
+    tiles = parsed_file.get_cel(1, 0).unpack_tiles()
+    assert isinstance(tiles, array.array)
+    assert list(tiles) == values.tolist()
+
+
+def test_tileset_tiles():
+    parsed_file = AsepriteFile(synthetic.generate(num_frames=1, tile_size=8, num_tiles=4))
+    [tileset] = [chunk for chunk in parsed_file.frames[0].chunks if isinstance(chunk, chunks.TilesetChunk)]
+    tiles = tileset.tiles(32)
+    assert tiles.shape == (4, 8, 8, 4)
+    # Tiles are stacked vertically in the tileset image
+    image = np.frombuffer(tileset.tileset_image, dtype=np.uint8).reshape(32, 8, 4)
+    for tile in range(4):
+        assert np.array_equal(tiles[tile], image[tile * 8:(tile + 1) * 8])
+
+
+@pytest.mark.parametrize('bits_per_tile', [8, 32])
+def test_flipped_tiles_are_laid_out(bits_per_tile):
+    (parsed_file, _) = tilemap_file(bits_per_tile)
+    tiles = tileset_tiles(parsed_file)[parsed_file.layers[1].tileset_index]
+    pixels = tilemap_pixels(parsed_file.get_cel(1, 0), tiles)
+    assert pixels.shape == (64, 64, 4)
+    for position in range(64):
+        tile = tiles[position % 4]
+        # Transposed first, then mirrored
+        if position & 4:
+            tile = tile.swapaxes(0, 1)
+        if position & 1:
+            tile = tile[:, ::-1]
+        if position & 2:
+            tile = tile[::-1]
+        (row, column) = divmod(position, 8)
+        assert np.array_equal(pixels[row * 8:(row + 1) * 8, column * 8:(column + 1) * 8], tile)